@@ -1,17 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import orjson
 
 from models import User, Role, Permission
-from schemas import UserResponse, UserCreate, UserUpdate, RoleResponse, RoleCreate, RoleUpdate
-from auth_dependencies import require_admin, get_current_active_user
-from auth_utils import get_password_hash, check_password_strength
-from user_utils import user_to_dict
+from schemas import UserCreate, UserUpdate, RoleResponse, RoleCreate, RoleUpdate
+from auth_dependencies import (
+    require_admin, get_current_active_user, invalidate_user_cache, invalidate_role_cache
+)
+from auth_utils import aget_password_hash, check_password_strength
+from user_utils import (
+    user_response_json, users_to_response_json, user_to_dict, raw_user_to_dict,
+    USER_RESPONSE_PROJECTION
+)
 
 router = APIRouter(prefix="/admin", tags=["user-management"])
 
+def parse_object_id(value: str, field: str) -> ObjectId:
+    """Validate a path parameter up front instead of catching DB-layer errors."""
+    if not ObjectId.is_valid(value):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {field} ID format"
+        )
+    return ObjectId(value)
+
 # User Management Endpoints
-@router.get("/users", response_model=List[UserResponse])
+@router.get("/users")
 async def get_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
@@ -19,59 +37,67 @@ async def get_users(
     current_user: User = Depends(require_admin)
 ):
     """Get all users (admin only)."""
-    query = User.find()
-    
+    # $text search uses the text index on username/email instead of the
+    # unanchored $regex collection scan the old `contains` produced
+    query_filter = {}
     if search:
-        query = query.find(
-            (User.username.contains(search)) | (User.email.contains(search))
-        )
-    
-    users = await query.skip(skip).limit(limit).to_list()
-    return [user_to_dict(user) for user in users]
+        query_filter = {"$text": {"$search": search}}
 
-@router.get("/users/{user_id}", response_model=UserResponse)
+    # Query through Motor with a projection: skips Beanie/Pydantic hydration
+    # and only decodes the fields the response actually emits
+    users = await User.get_motor_collection() \
+        .find(query_filter, USER_RESPONSE_PROJECTION) \
+        .skip(skip).limit(limit).to_list(limit)
+    # One pydantic-core dump for the whole page — no per-row re-validation
+    return Response(content=users_to_response_json(users),
+                    media_type="application/json")
+
+@router.get("/users/export")
+async def export_users(
+    search: Optional[str] = Query(None),
+    current_user: User = Depends(require_admin)
+):
+    """Stream all users as NDJSON (admin only)."""
+    query_filter = {}
+    if search:
+        query_filter = {"$text": {"$search": search}}
+
+    async def user_stream():
+        # One document in memory at a time; first byte goes out after the
+        # first document instead of after the whole result set
+        cursor = User.get_motor_collection().find(query_filter, USER_RESPONSE_PROJECTION)
+        async for doc in cursor:
+            yield orjson.dumps(raw_user_to_dict(doc)) + b"\n"
+
+    return StreamingResponse(user_stream(), media_type="application/x-ndjson")
+
+@router.get("/users/{user_id}")
 async def get_user(
     user_id: str,
     current_user: User = Depends(require_admin)
 ):
     """Get a specific user by ID (admin only)."""
-    try:
-        user = await User.find_one(User.id == ObjectId(user_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
-    
-    if not user:
+    # Read-only display path: a projected raw read decodes just the
+    # response fields instead of hydrating the full document
+    doc = await User.get_motor_collection().find_one(
+        {"_id": parse_object_id(user_id, "user")}, USER_RESPONSE_PROJECTION
+    )
+
+    if not doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return user_to_dict(user)
+    # Straight to bytes via the cached adapter — no re-validation pass
+    return Response(content=user_response_json(raw_user_to_dict(doc)),
+                    media_type="application/json")
 
-@router.post("/users", response_model=UserResponse)
+@router.post("/users")
 async def create_user(
     user_data: UserCreate,
     current_user: User = Depends(require_admin)
 ):
     """Create a new user (admin only)."""
-    # Check if username already exists
-    existing_user = await User.find_one(User.username == user_data.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already exists"
-        )
-    
-    # Check if email already exists
-    existing_user = await User.find_one(User.email == user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already exists"
-        )
-    
     # Validate password strength
     password_check = check_password_strength(user_data.password)
     if not password_check["is_valid"]:
@@ -80,8 +106,8 @@ async def create_user(
             detail=f"Password validation failed: {', '.join(password_check['issues'])}"
         )
     
-    # Create user
-    hashed_password = get_password_hash(user_data.password)
+    # Create user (hash runs in a worker thread; it's ~100ms of CPU)
+    hashed_password = await aget_password_hash(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
@@ -101,25 +127,30 @@ async def create_user(
     default_role = await Role.find_one(Role.name == "user")
     if default_role:
         user.role_ids.append(default_role.id)
-    
-    await user.insert()
-    return user_to_dict(user)
+        user.role_names.append(default_role.name)
 
-@router.put("/users/{user_id}", response_model=UserResponse)
+    # Rely on the unique indexes to detect duplicates (no pre-insert lookups)
+    try:
+        await user.insert()
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        field = "Email" if "email" in key_pattern else "Username"
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} already exists"
+        )
+    return Response(content=user_response_json(user_to_dict(user)),
+                    media_type="application/json")
+
+@router.put("/users/{user_id}")
 async def update_user(
     user_id: str,
     user_data: UserUpdate,
     current_user: User = Depends(require_admin)
 ):
     """Update a user (admin only)."""
-    try:
-        user = await User.find_one(User.id == ObjectId(user_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
-    
+    user = await User.find_one(User.id == parse_object_id(user_id, "user"))
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -128,39 +159,30 @@ async def update_user(
     
     # Update fields
     if user_data.username is not None:
-        # Check if new username already exists
-        existing_user = await User.find_one(
-            User.username == user_data.username,
-            User.id != ObjectId(user_id)
-        )
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Username already exists"
-            )
         user.username = user_data.username
-    
+
     if user_data.email is not None:
-        # Check if new email already exists
-        existing_user = await User.find_one(
-            User.email == user_data.email,
-            User.id != ObjectId(user_id)
-        )
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email already exists"
-            )
         user.email = user_data.email
-    
+
     if user_data.is_active is not None:
         user.is_active = user_data.is_active
-    
+
     if user_data.is_verified is not None:
         user.is_verified = user_data.is_verified
-    
-    await user.save()
-    return user_to_dict(user)
+
+    # The unique indexes catch username/email collisions on save
+    try:
+        await user.save()
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        field = "Email" if "email" in key_pattern else "Username"
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} already exists"
+        )
+    invalidate_user_cache(user_id)
+    return Response(content=user_response_json(user_to_dict(user)),
+                    media_type="application/json")
 
 @router.delete("/users/{user_id}")
 async def delete_user(
@@ -168,14 +190,8 @@ async def delete_user(
     current_user: User = Depends(require_admin)
 ):
     """Delete a user (admin only)."""
-    try:
-        user = await User.find_one(User.id == ObjectId(user_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user ID format"
-        )
-    
+    user = await User.find_one(User.id == parse_object_id(user_id, "user"))
+
     # Prevent admin from deleting themselves
     if user_id == str(current_user.id):
         raise HTTPException(
@@ -190,14 +206,25 @@ async def delete_user(
         )
     
     await user.delete()
+    invalidate_user_cache(user_id)
     return {"message": "User deleted successfully"}
 
 # Role Management Endpoints
 @router.get("/roles", response_model=List[RoleResponse])
 async def get_roles(current_user: User = Depends(require_admin)):
     """Get all roles (admin only)."""
-    roles = await Role.find_all().to_list()
-    return roles
+    # Raw dicts straight from Motor: no Beanie hydration needed for a listing
+    roles = await Role.get_motor_collection().find().to_list(length=None)
+    return [
+        {
+            "id": str(role["_id"]),
+            "name": role["name"],
+            "description": role.get("description"),
+            "created_at": role["created_at"],
+            "permission_ids": [str(pid) for pid in role.get("permission_ids", [])],
+        }
+        for role in roles
+    ]
 
 @router.post("/roles", response_model=RoleResponse)
 async def create_role(
@@ -205,20 +232,19 @@ async def create_role(
     current_user: User = Depends(require_admin)
 ):
     """Create a new role (admin only)."""
-    # Check if role name already exists
-    existing_role = await Role.find_one(Role.name == role_data.name)
-    if existing_role:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Role name already exists"
-        )
-    
     role = Role(
         name=role_data.name,
         description=role_data.description
     )
-    
-    await role.insert()
+
+    # Rely on the unique index on Role.name to detect duplicates
+    try:
+        await role.insert()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Role name already exists"
+        )
     return role
 
 @router.put("/roles/{role_id}", response_model=RoleResponse)
@@ -228,14 +254,8 @@ async def update_role(
     current_user: User = Depends(require_admin)
 ):
     """Update a role (admin only)."""
-    try:
-        role = await Role.find_one(Role.id == ObjectId(role_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid role ID format"
-        )
-    
+    role = await Role.find_one(Role.id == parse_object_id(role_id, "role"))
+
     if not role:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -249,23 +269,30 @@ async def update_role(
             detail="Cannot modify default roles"
         )
     
+    old_name = role.name
     if role_data.name is not None:
-        # Check if new name already exists
-        existing_role = await Role.find_one(
-            Role.name == role_data.name,
-            Role.id != ObjectId(role_id)
-        )
-        if existing_role:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Role name already exists"
-            )
         role.name = role_data.name
-    
+
     if role_data.description is not None:
         role.description = role_data.description
-    
-    await role.save()
+
+    # The unique index on Role.name catches collisions on save
+    try:
+        await role.save()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Role name already exists"
+        )
+
+    # Keep the denormalized role_names on users in sync with the rename
+    if role.name != old_name:
+        await User.get_motor_collection().update_many(
+            {"role_ids": role.id},
+            {"$set": {"role_names.$[elem]": role.name}},
+            array_filters=[{"elem": old_name}]
+        )
+    invalidate_role_cache(role.id)
     return role
 
 @router.delete("/roles/{role_id}")
@@ -274,14 +301,8 @@ async def delete_role(
     current_user: User = Depends(require_admin)
 ):
     """Delete a role (admin only)."""
-    try:
-        role = await Role.find_one(Role.id == ObjectId(role_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid role ID format"
-        )
-    
+    role = await Role.find_one(Role.id == parse_object_id(role_id, "role"))
+
     if not role:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -295,8 +316,10 @@ async def delete_role(
             detail="Cannot delete default roles"
         )
     
-    # Check if role is assigned to any users
-    users_with_role = await User.find(User.role_ids == ObjectId(role_id)).to_list()
+    # Check if role is assigned to any users (count with limit, no hydration)
+    users_with_role = await User.get_motor_collection().count_documents(
+        {"role_ids": ObjectId(role_id)}, limit=1
+    )
     if users_with_role:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -304,6 +327,7 @@ async def delete_role(
         )
     
     await role.delete()
+    invalidate_role_cache(role.id)
     return {"message": "Role deleted successfully"}
 
 # User-Role Assignment Endpoints
@@ -314,15 +338,14 @@ async def assign_role_to_user(
     current_user: User = Depends(require_admin)
 ):
     """Assign a role to a user (admin only)."""
-    try:
-        user = await User.find_one(User.id == ObjectId(user_id))
-        role = await Role.find_one(Role.id == ObjectId(role_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user or role ID format"
-        )
-    
+    user_oid = parse_object_id(user_id, "user")
+    role_oid = parse_object_id(role_id, "role")
+    # The two lookups are independent, so run them in one wall-clock RTT
+    user, role = await asyncio.gather(
+        User.find_one(User.id == user_oid),
+        Role.find_one(Role.id == role_oid)
+    )
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -343,8 +366,11 @@ async def assign_role_to_user(
         )
     
     user.role_ids.append(ObjectId(role_id))
+    if role.name not in user.role_names:
+        user.role_names.append(role.name)
     await user.save()
-    
+    invalidate_user_cache(user_id)
+
     return {"message": f"Role '{role.name}' assigned to user '{user.username}'"}
 
 @router.delete("/users/{user_id}/roles/{role_id}")
@@ -354,15 +380,14 @@ async def remove_role_from_user(
     current_user: User = Depends(require_admin)
 ):
     """Remove a role from a user (admin only)."""
-    try:
-        user = await User.find_one(User.id == ObjectId(user_id))
-        role = await Role.find_one(Role.id == ObjectId(role_id))
-    except:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid user or role ID format"
-        )
-    
+    user_oid = parse_object_id(user_id, "user")
+    role_oid = parse_object_id(role_id, "role")
+    # The two lookups are independent, so run them in one wall-clock RTT
+    user, role = await asyncio.gather(
+        User.find_one(User.id == user_oid),
+        Role.find_one(Role.id == role_oid)
+    )
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -375,10 +400,13 @@ async def remove_role_from_user(
             detail="Role not found"
         )
     
-    # Prevent removing admin role from the last admin
+    # Prevent removing admin role from the last admin (count other admins
+    # with a limit instead of materializing every admin user)
     if role.name == "admin":
-        admin_users = await User.find(User.role_ids == ObjectId(role_id)).to_list()
-        if len(admin_users) == 1 and user in admin_users:
+        other_admins = await User.get_motor_collection().count_documents(
+            {"role_ids": ObjectId(role_id), "_id": {"$ne": user.id}}, limit=1
+        )
+        if other_admins == 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Cannot remove admin role from the last admin user"
@@ -392,6 +420,9 @@ async def remove_role_from_user(
         )
     
     user.role_ids.remove(ObjectId(role_id))
+    if role.name in user.role_names:
+        user.role_names.remove(role.name)
     await user.save()
-    
+    invalidate_user_cache(user_id)
+
     return {"message": f"Role '{role.name}' removed from user '{user.username}'"}
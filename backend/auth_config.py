@@ -16,6 +16,12 @@ class AuthSettings(BaseSettings):
     # MongoDB Settings
     mongodb_url: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     mongodb_database: str = os.getenv("MONGODB_DATABASE", "visionffe_auth")
+
+    # MongoDB connection pool (minPoolSize > 0 pre-warms connections so the
+    # first requests don't pay the TLS handshake)
+    mongo_max_pool_size: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+    mongo_min_pool_size: int = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+    mongo_max_connecting: int = int(os.getenv("MONGO_MAX_CONNECTING", "4"))
     
     # Password Settings
     password_min_length: int = 8
@@ -1,8 +1,9 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional, List
+from typing import List
 from datetime import datetime
 from bson import ObjectId
+from cachetools import TTLCache
 
 from models import User, Role, Permission, Token
 from auth_utils import verify_token
@@ -11,6 +12,59 @@ from auth_config import auth_settings
 # Security scheme
 security = HTTPBearer()
 
+# In-process caches for the stateless access-token path: user documents keyed
+# by the token "sub" claim, plus per-user revocation cutoffs that logout and
+# password-change refresh. Access tokens are validated purely from the JWT
+# signature; only refresh tokens still hit the Token collection.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_revocation_cutoffs: TTLCache = TTLCache(
+    maxsize=10_000,
+    ttl=auth_settings.access_token_expire_minutes * 60
+)
+
+def revoke_user_tokens(user_id: str):
+    """Revoke all access tokens issued to a user before now."""
+    # Truncate to whole seconds to match the JWT iat NumericDate: a token
+    # issued in the same second as the revocation (e.g. the re-login right
+    # after a password change) must not compare below the cutoff
+    _revocation_cutoffs[user_id] = datetime.utcnow().replace(microsecond=0)
+    _user_cache.pop(user_id, None)
+
+def invalidate_user_cache(user_id: str):
+    """Drop a user from the in-process cache after an update/delete."""
+    _user_cache.pop(user_id, None)
+    _legacy_role_names_cache.pop(user_id, None)
+
+# Resolved role names for legacy users (no denormalized role_names field):
+# avoids re-running the roles aggregation on every authorized request
+_legacy_role_names_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+
+# Role documents change rarely, so cache them by id for a short TTL
+_role_cache: TTLCache = TTLCache(maxsize=1_000, ttl=60)
+
+def invalidate_role_cache(role_id):
+    """Drop a role from the in-process cache after an update/delete."""
+    _role_cache.pop(role_id, None)
+
+async def get_roles_by_ids(role_ids: List[ObjectId]) -> List[Role]:
+    """Fetch roles by id through the cache, querying only the missing ones."""
+    roles = []
+    missing_ids = []
+    for role_id in role_ids:
+        role = _role_cache.get(role_id)
+        if role is None:
+            missing_ids.append(role_id)
+        else:
+            roles.append(role)
+
+    if missing_ids:
+        fetched = await Role.find({"_id": {"$in": missing_ids}}).to_list()
+        for role in fetched:
+            _role_cache[role.id] = role
+        roles.extend(fetched)
+
+    return roles
+
 class AuthError(HTTPException):
     def __init__(self, detail: str = "Authentication failed"):
         super().__init__(
@@ -32,32 +86,30 @@ async def get_current_user(
     """Get the current authenticated user."""
     token = credentials.credentials
     
-    # Verify token
+    # Verify token (signature + expiry are checked by the JWT decode)
     payload = verify_token(token, "access")
     if not payload:
         raise AuthError("Invalid token")
-    
-    # Check if token is revoked
-    db_token = await Token.find_one(
-        Token.token == token,
-        Token.is_revoked == False
-    )
-    
-    if not db_token:
+
+    # Check the in-memory per-user revocation cutoff (no DB round-trip)
+    sub = payload.get("sub")
+    cutoff = _revocation_cutoffs.get(sub)
+    if cutoff and datetime.utcfromtimestamp(payload.get("iat", 0)) < cutoff:
         raise AuthError("Token has been revoked")
-    
-    # Check if token is expired
-    if db_token.expires_at < datetime.utcnow():
-        raise AuthError("Token has expired")
-    
-    # Get user
-    user = await User.find_one(User.id == ObjectId(payload.get("sub")))
-    if not user:
-        raise AuthError("User not found")
-    
+
+    # Get user (cached for a short TTL to keep the hot path off MongoDB)
+    user = _user_cache.get(sub)
+    if user is None:
+        if not ObjectId.is_valid(sub):
+            raise AuthError("User not found")
+        user = await User.find_one(User.id == ObjectId(sub))
+        if not user:
+            raise AuthError("User not found")
+        _user_cache[sub] = user
+
     if not user.is_active:
         raise AuthError("User account is deactivated")
-    
+
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
@@ -76,32 +128,55 @@ async def get_user_roles_and_permissions(user: User) -> tuple[List[Role], List[P
     """Get user's roles and their permissions."""
     if not user.role_ids:
         return [], []
-    
-    # Get user's roles using Beanie's query syntax
-    roles = await Role.find({"_id": {"$in": user.role_ids}}).to_list()
 
+    # Single aggregation round-trip: $lookup joins each role's permissions
+    # instead of a second serial Permission query
+    docs = await Role.aggregate([
+        {"$match": {"_id": {"$in": user.role_ids}}},
+        {"$lookup": {
+            "from": Permission.get_motor_collection().name,
+            "localField": "permission_ids",
+            "foreignField": "_id",
+            "as": "_permissions"
+        }}
+    ]).to_list()
+
+    roles = []
+    permissions = []
+    seen_permission_ids = set()
+    for doc in docs:
+        permission_docs = doc.pop("_permissions", [])
+        roles.append(Role.model_validate(doc))
+        for permission_doc in permission_docs:
+            if permission_doc["_id"] not in seen_permission_ids:
+                seen_permission_ids.add(permission_doc["_id"])
+                permissions.append(Permission.model_validate(permission_doc))
 
-    # Get all permissions for these roles
-    permission_ids = []
-    for role in roles:
-        permission_ids.extend(role.permission_ids)
-    
-    if not permission_ids:
-        return roles, []
-    
-    permissions = await Permission.find({"_id": {"$in": permission_ids}}).to_list()
     return roles, permissions
 
+async def get_user_role_names(user: User) -> List[str]:
+    """Get the user's role names from the denormalized field (query fallback
+    for legacy users created before role_names existed)."""
+    if user.role_names or not user.role_ids:
+        return user.role_names
+    cached = _legacy_role_names_cache.get(str(user.id))
+    if cached is not None:
+        return cached
+    roles, _ = await get_user_roles_and_permissions(user)
+    role_names = [role.name for role in roles]
+    _legacy_role_names_cache[str(user.id)] = role_names
+    return role_names
+
 def require_permission(resource: str, action: str):
     """Decorator to require specific permission."""
     async def permission_checker(current_user: User = Depends(get_current_active_user)) -> User:
+        # Check if user has admin role (full access) without querying
+        if "admin" in await get_user_role_names(current_user):
+            return current_user
+
         # Get user's roles and permissions
         roles, permissions = await get_user_roles_and_permissions(current_user)
-        # Check if user has admin role (full access)
-        admin_role = any(role.name == "admin" for role in roles)
-        if admin_role:
-            return current_user
-        
+
         # Check specific permission
         has_permission = False
         for permission in permissions:
@@ -120,30 +195,25 @@ def require_permission(resource: str, action: str):
 def require_role(role_name: str):
     """Decorator to require specific role."""
     async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
-        roles, _ = await get_user_roles_and_permissions(current_user)
-        has_role = any(role.name == role_name for role in roles)
-        if not has_role:
+        role_names = await get_user_role_names(current_user)
+        if role_name not in role_names:
             raise PermissionError(f"Role required: {role_name}")
         return current_user
-    
+
     return role_checker
 
 def require_role_or_admin(role_name: str):
     """Decorator to require a specific role or admin."""
     async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
-        roles, _ = await get_user_roles_and_permissions(current_user)
-        is_admin = any(role.name == "admin" for role in roles)
-        has_role = any(role.name == role_name for role in roles)
-        if not (is_admin or has_role):
+        role_names = await get_user_role_names(current_user)
+        if not ("admin" in role_names or role_name in role_names):
             raise PermissionError(f"Role required: {role_name} or admin")
         return current_user
     return role_checker
 
 async def require_admin(current_user: User = Depends(get_current_active_user)) -> User:
     """Require admin role."""
-    roles, _ = await get_user_roles_and_permissions(current_user)
-    admin_role = any(role.name == "admin" for role in roles)
-    if not admin_role:
+    if "admin" not in await get_user_role_names(current_user):
         raise PermissionError("Admin role required")
     return current_user
 
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from datetime import datetime, timedelta
 from typing import List
+import asyncio
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from models import User, Role, Token
 from schemas import (
@@ -9,34 +11,23 @@ from schemas import (
     PasswordChangeRequest, UserResponse, UserCreate, UserUpdate, UserWithRoles, RoleResponse
 )
 from auth_utils import (
-    verify_password, get_password_hash, create_access_token, create_refresh_token,
-    verify_token, generate_token_id, check_password_strength
+    averify_password, aget_password_hash, create_access_token, create_refresh_token,
+    verify_token, generate_token_id, check_password_strength, needs_password_rehash,
+    hash_token
+)
+from auth_dependencies import (
+    get_current_user, get_current_active_user, require_admin, revoke_user_tokens,
+    get_roles_by_ids
 )
-from auth_dependencies import get_current_user, get_current_active_user, require_admin
 from auth_config import auth_settings
-from user_utils import user_to_dict
+from task_utils import spawn
+from user_utils import user_response_json, user_to_dict
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserResponse)
+@router.post("/register")
 async def register(user_data: RegisterRequest):
     """Register a new user."""
-    # Check if username already exists
-    existing_user = await User.find_one(User.username == user_data.username)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    
-    # Check if email already exists
-    existing_user = await User.find_one(User.email == user_data.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    
     # Validate password strength
     password_check = check_password_strength(user_data.password)
     if not password_check["is_valid"]:
@@ -45,8 +36,8 @@ async def register(user_data: RegisterRequest):
             detail=f"Password validation failed: {', '.join(password_check['issues'])}"
         )
     
-    # Create user
-    hashed_password = get_password_hash(user_data.password)
+    # Create user (hash runs in a worker thread; it's ~100ms of CPU)
+    hashed_password = await aget_password_hash(user_data.password)
     user = User(
         username=user_data.username,
         email=user_data.email,
@@ -69,11 +60,22 @@ async def register(user_data: RegisterRequest):
         })
     if default_role:
         user.role_ids.append(default_role.id)
-    
-    await user.insert()
-    
-    # Convert to dict and ensure ObjectIds are strings
-    return user_to_dict(user)
+        user.role_names.append(default_role.name)
+
+    # Rely on the unique indexes to detect duplicates (no pre-insert lookups)
+    try:
+        await user.insert()
+    except DuplicateKeyError as e:
+        key_pattern = (e.details or {}).get("keyPattern", {})
+        field = "Email" if "email" in key_pattern else "Username"
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} already registered"
+        )
+
+    # Straight to bytes via the cached adapter — no re-validation pass
+    return Response(content=user_response_json(user_to_dict(user)),
+                    media_type="application/json")
 
 @router.post("/login", response_model=TokenResponse)
 async def login(login_data: LoginRequest):
@@ -87,7 +89,7 @@ async def login(login_data: LoginRequest):
         }
     )
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not user or not await averify_password(login_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -98,27 +100,25 @@ async def login(login_data: LoginRequest):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User account is deactivated"
         )
-    
+
+    # Transparently migrate hashes stored with deprecated schemes/params
+    if needs_password_rehash(user.hashed_password):
+        user.hashed_password = await aget_password_hash(login_data.password)
+        await user.save()
+
     # Create tokens
     access_token = create_access_token(data={"sub": str(user.id)})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
     
-    # Store tokens in database
-    access_token_record = Token(
-        token=access_token,
-        token_type="access",
-        expires_at=datetime.utcnow() + timedelta(minutes=auth_settings.access_token_expire_minutes),
-        user_id=user.id
-    )
-    
+    # Store only the refresh token in the database (hashed, never cleartext).
+    # Access tokens are short-lived and validated statelessly from the JWT.
     refresh_token_record = Token(
-        token=refresh_token,
+        token=hash_token(refresh_token),
         token_type="refresh",
         expires_at=datetime.utcnow() + timedelta(days=auth_settings.refresh_token_expire_days),
         user_id=user.id
     )
-    
-    await access_token_record.insert()
+
     await refresh_token_record.insert()
     
     return TokenResponse(
@@ -138,20 +138,22 @@ async def refresh_token(refresh_data: RefreshTokenRequest):
             detail="Invalid refresh token"
         )
     
-    # Check if token exists and is not revoked
-    token_record = await Token.find_one(
-        Token.token == refresh_data.refresh_token,
-        Token.is_revoked == False
+    # Check if token exists and is not revoked. Projecting expires_at (and
+    # excluding _id, which would otherwise sneak in) keeps this an
+    # index-covered read instead of fetching the whole document.
+    token_record = await Token.get_motor_collection().find_one(
+        {"token": hash_token(refresh_data.refresh_token), "is_revoked": False},
+        {"expires_at": 1, "_id": 0}
     )
-    
+
     if not token_record:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token not found or revoked"
         )
-    
+
     # Check if token is expired
-    if token_record.expires_at < datetime.utcnow():
+    if token_record["expires_at"] < datetime.utcnow():
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token has expired"
@@ -165,19 +167,9 @@ async def refresh_token(refresh_data: RefreshTokenRequest):
             detail="User not found or inactive"
         )
     
-    # Create new access token
+    # Create new access token (stateless — nothing to store)
     new_access_token = create_access_token(data={"sub": str(user.id)})
-    
-    # Store new access token
-    new_token_record = Token(
-        token=new_access_token,
-        token_type="access",
-        expires_at=datetime.utcnow() + timedelta(minutes=auth_settings.access_token_expire_minutes),
-        user_id=user.id
-    )
-    
-    await new_token_record.insert()
-    
+
     return TokenResponse(
         access_token=new_access_token,
         refresh_token=refresh_data.refresh_token,  # Keep the same refresh token
@@ -187,11 +179,16 @@ async def refresh_token(refresh_data: RefreshTokenRequest):
 @router.post("/logout")
 async def logout(current_user: User = Depends(get_current_user)):
     """Logout by revoking all user tokens."""
-    # Revoke all active tokens for the user
-    await Token.find(Token.user_id == current_user.id, Token.is_revoked == False).update_many(
-        {"$set": {"is_revoked": True}}
+    # Revoke access tokens in-process; the in-memory cutoff already blocks
+    # them, so persist the DB-side revocation in the background instead of
+    # making the client wait on the write
+    revoke_user_tokens(str(current_user.id))
+    spawn(
+        Token.find(Token.user_id == current_user.id, Token.is_revoked == False).update_many(
+            {"$set": {"is_revoked": True}}
+        )
     )
-    
+
     return {"message": "Successfully logged out"}
 
 @router.post("/change-password")
@@ -201,7 +198,7 @@ async def change_password(
 ):
     """Change user password."""
     # Verify current password
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await averify_password(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -215,14 +212,16 @@ async def change_password(
             detail=f"Password validation failed: {', '.join(password_check['issues'])}"
         )
     
-    # Update password
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    # Update password and revoke all existing tokens to force re-login.
+    # The two writes touch independent collections, so run them concurrently.
+    current_user.hashed_password = await aget_password_hash(password_data.new_password)
     current_user.updated_at = datetime.utcnow()
-    await current_user.save()
-    
-    # Revoke all existing tokens to force re-login
-    await Token.find(Token.user_id == current_user.id, Token.is_revoked == False).update_many(
-        {"$set": {"is_revoked": True}}
+    revoke_user_tokens(str(current_user.id))
+    await asyncio.gather(
+        current_user.save(),
+        Token.find(Token.user_id == current_user.id, Token.is_revoked == False).update_many(
+            {"$set": {"is_revoked": True}}
+        )
     )
     
     return {"message": "Password changed successfully. Please login again."}
@@ -233,7 +232,8 @@ async def get_current_user_info(current_user: User = Depends(get_current_active_
     user_dict = user_to_dict(current_user)
     roles = []
     if current_user.role_ids:
-        roles = await Role.find({"_id": {"$in": current_user.role_ids}}).to_list()
+        # Served from the role cache; only missing roles hit MongoDB
+        roles = await get_roles_by_ids(current_user.role_ids)
     # Map roles to RoleResponse-like dicts
     user_dict["roles"] = [
         {
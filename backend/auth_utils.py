@@ -2,20 +2,75 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
+from cachetools import TTLCache
 from auth_config import auth_settings
+import asyncio
+import hmac
 import secrets
+import threading
+import time
 
-# Password hashing
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+# Password hashing: Argon2id with tuned cost, bcrypt kept as a fallback
+# verifier so pre-existing hashes keep working (and get upgraded on login)
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=65536,
+    argon2__parallelism=2
+)
+
+# Verification cache: a full argon2 verify costs ~100ms of CPU, so repeat
+# logins are served by comparing a keyed blake2b digest instead. Keys are
+# (stored hash, HMAC(secret, password)) so nothing usable leaks from memory
+# and entries die naturally when the stored hash changes. Failed attempts
+# only get a 1-second negative cache so brute forcing still pays full price.
+_verify_cache: TTLCache = TTLCache(maxsize=50_000, ttl=300)
+_negative_verify_cache: TTLCache = TTLCache(maxsize=10_000, ttl=1)
+# verify_password runs in to_thread workers and cachetools caches are not
+# thread-safe (even .get mutates the TTL expiry list), so serialize access
+_verify_cache_lock = threading.Lock()
+
+def _password_cache_key(plain_password: str, hashed_password: str) -> tuple:
+    digest = hmac.new(
+        auth_settings.secret_key.encode(), plain_password.encode(), "blake2b"
+    ).digest()
+    return (hashed_password, digest)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    key = _password_cache_key(plain_password, hashed_password)
+    with _verify_cache_lock:
+        if _verify_cache.get(key) == hashed_password:
+            return True
+        if key in _negative_verify_cache:
+            return False
+
+    # The ~100ms argon2 verify runs outside the lock
+    is_valid = pwd_context.verify(plain_password, hashed_password)
+    with _verify_cache_lock:
+        if is_valid:
+            _verify_cache[key] = hashed_password
+        else:
+            _negative_verify_cache[key] = True
+    return is_valid
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in a worker thread so the event loop isn't blocked."""
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+async def aget_password_hash(password: str) -> str:
+    """Hash a password in a worker thread so the event loop isn't blocked."""
+    return await asyncio.to_thread(pwd_context.hash, password)
+
+def needs_password_rehash(hashed_password: str) -> bool:
+    """Check whether a stored hash uses a deprecated scheme or stale params."""
+    return pwd_context.needs_update(hashed_password)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -24,7 +79,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=auth_settings.access_token_expire_minutes)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "type": "access", "jti": generate_token_id()})
     encoded_jwt = jwt.encode(to_encode, auth_settings.secret_key, algorithm=auth_settings.algorithm)
     return encoded_jwt
 
@@ -36,39 +91,70 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
     encoded_jwt = jwt.encode(to_encode, auth_settings.secret_key, algorithm=auth_settings.algorithm)
     return encoded_jwt
 
+# Decoded-JWT cache: hot tokens skip the HMAC verify + JSON decode. Expiry is
+# still enforced against the cached exp claim on every hit.
+_jwt_cache: TTLCache = TTLCache(maxsize=50_000, ttl=60)
+
 def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
     """Verify and decode a JWT token."""
-    try:
-        payload = jwt.decode(token, auth_settings.secret_key, algorithms=[auth_settings.algorithm])
-        if payload.get("type") != token_type:
+    payload = _jwt_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, auth_settings.secret_key, algorithms=[auth_settings.algorithm])
+        except JWTError:
             return None
-        return payload
-    except JWTError:
+        _jwt_cache[token] = payload
+    elif payload.get("exp", 0) <= time.time():
+        _jwt_cache.pop(token, None)
+        return None
+
+    if payload.get("type") != token_type:
         return None
+    return payload
 
 def generate_token_id() -> str:
     """Generate a unique token ID for database storage."""
     return secrets.token_urlsafe(32)
 
+def hash_token(token: str) -> str:
+    """Keyed hash of a token for database storage (never store the cleartext)."""
+    return hmac.new(auth_settings.secret_key.encode(), token.encode(), "blake2b").hexdigest()
+
+# Precomputed special-character set for check_password_strength
+_SPECIAL_CHARS = frozenset("!@#$%^&*()_+-=[]{}|;:,.<>?")
+
 def check_password_strength(password: str) -> Dict[str, Any]:
     """Check password strength and return validation results."""
     issues = []
-    
+
+    # Cheapest check first
     if len(password) < auth_settings.password_min_length:
         issues.append(f"Password must be at least {auth_settings.password_min_length} characters long")
-    
-    if not any(c.isupper() for c in password):
+
+    # Classify all character classes in a single pass
+    has_upper = has_lower = has_digit = has_special = False
+    for c in password:
+        if c.isupper():
+            has_upper = True
+        elif c.islower():
+            has_lower = True
+        elif c.isdigit():
+            has_digit = True
+        elif c in _SPECIAL_CHARS:
+            has_special = True
+
+    if not has_upper:
         issues.append("Password must contain at least one uppercase letter")
-    
-    if not any(c.islower() for c in password):
+
+    if not has_lower:
         issues.append("Password must contain at least one lowercase letter")
-    
-    if not any(c.isdigit() for c in password):
+
+    if not has_digit:
         issues.append("Password must contain at least one digit")
-    
-    if not any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password):
+
+    if not has_special:
         issues.append("Password must contain at least one special character")
-    
+
     return {
         "is_valid": len(issues) == 0,
         "issues": issues,
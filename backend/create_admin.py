@@ -7,7 +7,10 @@ Run this script after setting up the database to create your first admin user.
 import sys
 import os
 import asyncio
+import argparse
 from bson import ObjectId
+from pydantic import BaseModel
+from pymongo.errors import DuplicateKeyError
 
 # Add the backend directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -16,43 +19,55 @@ from database import init_database, init_default_data
 from models import User, Role
 from auth_utils import get_password_hash, check_password_strength
 
-async def create_admin_user():
-    """Create an admin user interactively."""
+class AdminUserPreview(BaseModel):
+    """Projection for the existence check — no need to pull full user docs."""
+    username: str
+    email: str
+
+async def create_admin_user(username=None, email=None, password=None):
+    """Create an admin user, interactively unless credentials are passed in."""
     print("🔐 VisionFFE Admin User Creation")
     print("=" * 40)
-    
+
+    # Non-interactive mode (CI/provisioning): all credentials supplied up
+    # front, so skip the prompts and the existing-admin confirmation
+    scripted = bool(username and email and password)
+
     # Initialize database
     await init_database()
     await init_default_data()
-    
+
     try:
-        # Check if any admin users already exist
         admin_role = await Role.find_one(Role.name == "admin")
-        if admin_role:
-            admin_users = await User.find(User.role_ids == admin_role.id).to_list()
-            if admin_users:
-                print("⚠️  Admin users already exist:")
-                for user in admin_users:
-                    print(f"   - {user.username} ({user.email})")
-                
-                response = input("\nDo you want to create another admin user? (y/N): ").strip().lower()
-                if response != 'y':
-                    print("❌ Admin user creation cancelled.")
-                    return
-        
-        # Get user input
-        print("\nPlease provide the following information:")
-        username = input("Username: ").strip()
+
+        if not scripted:
+            # Check if any admin users already exist (projected existence
+            # probe, no full user documents pulled over the wire)
+            if admin_role:
+                existing_admin = await User.find(User.role_ids == admin_role.id) \
+                    .project(AdminUserPreview).first_or_none()
+                if existing_admin:
+                    print(f"⚠️  An admin user already exists: {existing_admin.username} ({existing_admin.email})")
+
+                    response = input("\nDo you want to create another admin user? (y/N): ").strip().lower()
+                    if response != 'y':
+                        print("❌ Admin user creation cancelled.")
+                        return
+
+            # Get user input
+            print("\nPlease provide the following information:")
+            username = input("Username: ").strip()
+            email = input("Email: ").strip()
+            password = input("Password: ").strip()
+
         if not username:
             print("❌ Username cannot be empty.")
             return
-        
-        email = input("Email: ").strip()
+
         if not email:
             print("❌ Email cannot be empty.")
             return
-        
-        password = input("Password: ").strip()
+
         if not password:
             print("❌ Password cannot be empty.")
             return
@@ -65,19 +80,7 @@ async def create_admin_user():
                 print(f"   - {issue}")
             return
         
-        # Check if username already exists
-        existing_user = await User.find_one(User.username == username)
-        if existing_user:
-            print(f"❌ Username '{username}' already exists.")
-            return
-        
-        # Check if email already exists
-        existing_user = await User.find_one(User.email == email)
-        if existing_user:
-            print(f"❌ Email '{email}' already exists.")
-            return
-        
-        # Create user
+        # Create user (the unique indexes catch duplicate username/email)
         hashed_password = get_password_hash(password)
         user = User(
             username=username,
@@ -90,9 +93,18 @@ async def create_admin_user():
         # Assign admin role
         if admin_role:
             user.role_ids.append(admin_role.id)
+            user.role_names.append(admin_role.name)
         
-        await user.insert()
-        
+        try:
+            await user.insert()
+        except DuplicateKeyError as e:
+            key_pattern = (e.details or {}).get("keyPattern", {})
+            if "email" in key_pattern:
+                print(f"❌ Email '{email}' already exists.")
+            else:
+                print(f"❌ Username '{username}' already exists.")
+            return
+
         print(f"\n✅ Admin user '{username}' created successfully!")
         print(f"   Email: {email}")
         print(f"   User ID: {user.id}")
@@ -102,7 +114,20 @@ async def create_admin_user():
 
 def main():
     """Main function to run the async admin creation."""
-    asyncio.run(create_admin_user())
+    parser = argparse.ArgumentParser(description="Create a VisionFFE admin user.")
+    parser.add_argument("--username", help="Admin username (skips the interactive prompts)")
+    parser.add_argument("--email", help="Admin email")
+    parser.add_argument("--password",
+                        default=os.getenv("ADMIN_PASSWORD"),
+                        help="Admin password (or set ADMIN_PASSWORD to keep it out of shell history)")
+    args = parser.parse_args()
+
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass  # stdlib loop is fine for a one-off script
+    asyncio.run(create_admin_user(args.username, args.email, args.password))
 
 if __name__ == "__main__":
     main()
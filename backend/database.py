@@ -19,13 +19,19 @@ async def init_database():
         is_atlas = "mongodb+srv://" in auth_settings.mongodb_url
 
         # Build connection parameters
+        # Timeouts play different roles: server selection and TCP connect
+        # should fail fast, while queries may legitimately run longer, and
+        # waitQueueTimeoutMS bounds how long a request queues on a saturated
+        # pool instead of hanging
         connection_kwargs = {
-            "serverSelectionTimeoutMS": 10000,
-            "connectTimeoutMS": 10000,
-            "socketTimeoutMS": 10000,
+            "serverSelectionTimeoutMS": 5000,
+            "connectTimeoutMS": 5000,
+            "socketTimeoutMS": 30000,
             "retryWrites": True,
-            "maxPoolSize": 10,
-            "minPoolSize": 1,
+            "maxPoolSize": auth_settings.mongo_max_pool_size,
+            "minPoolSize": auth_settings.mongo_min_pool_size,
+            "maxConnecting": auth_settings.mongo_max_connecting,
+            "waitQueueTimeoutMS": 2000,
             "retryReads": True
         }
 
@@ -43,12 +49,11 @@ async def init_database():
                 "tls": False
             })
 
-        # Create MongoDB client
+        # Create MongoDB client (single pooled client shared by the app).
+        # connection_kwargs carries the Atlas/local TLS branch from above.
         client = AsyncIOMotorClient(
             auth_settings.mongodb_url,
-            tls=True,
-            tlsCAFile=certifi.where(),
-            tlsAllowInvalidCertificates=False
+            **connection_kwargs
         )
 
         # Test connection
@@ -81,9 +86,9 @@ async def close_database():
 async def init_default_data():
     """Initialize default roles and permissions."""
     try:
-        # Check if roles already exist
-        existing_role = await Role.find_one()
-        if existing_role:
+        # Check if roles already exist — only existence matters, so read the
+        # cached collection metadata instead of fetching a full document
+        if await Role.get_motor_collection().estimated_document_count() > 0:
             return
 
         # Create default permissions
@@ -126,9 +131,10 @@ async def init_default_data():
             ),
         ]
 
-        # Insert permissions
-        for permission in permissions:
-            await permission.insert()
+        # Insert permissions in one batched write instead of one RTT each
+        result = await Permission.insert_many(permissions)
+        for permission, inserted_id in zip(permissions, result.inserted_ids):
+            permission.id = inserted_id
 
         # Create default roles
         admin_role = Role(
@@ -155,11 +161,8 @@ async def init_default_data():
             permission_ids=[permissions[1].id, permissions[2].id, permissions[3].id]
         )
 
-        # Insert roles
-        await admin_role.insert()
-        await user_role.insert()
-        await viewer_role.insert()
-        await designer_role.insert()
+        # Insert roles in one batched write
+        await Role.insert_many([admin_role, user_role, viewer_role, designer_role])
 
         print("✅ Default roles and permissions created")
 
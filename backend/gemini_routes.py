@@ -3,7 +3,8 @@ API routes for Gemini AI service endpoints.
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi.responses import Response
+from pydantic import BaseModel, ConfigDict
 from typing import List
 import base64
 import json
@@ -14,11 +15,41 @@ from models import User
 
 router = APIRouter(prefix="/api/gemini", tags=["gemini"])
 
+# ~20 MB of base64 (~15 MB decoded) — anything bigger is rejected before
+# we spend a multi-second Gemini call on it
+MAX_BASE64_LEN = 20 * 1024 * 1024
+
+def validate_image(img: "ImageInputRequest"):
+    """Cheap fail-fast gate: size cap plus magic-byte sniff of the header.
+
+    Decodes only the first 24 base64 chars, so garbage or oversized
+    payloads are bounced with a 400 before any decode or network I/O.
+    """
+    if len(img.base64) > MAX_BASE64_LEN:
+        raise HTTPException(status_code=400, detail="Image too large")
+    try:
+        header = base64.b64decode(img.base64[:24])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid base64 image data")
+    if (header[:3] != b'\xff\xd8\xff'            # JPEG
+            and header[:8] != b'\x89PNG\r\n\x1a\n'  # PNG
+            and header[:4] != b'RIFF'):             # WebP
+        raise HTTPException(status_code=400, detail="Unsupported or invalid image format")
+
+# Request bodies here are dominated by large base64 payloads, so skip any
+# work Pydantic doesn't strictly need: ignore unknown fields instead of
+# collecting them, and never revalidate defaults
+_REQUEST_CONFIG = ConfigDict(extra="ignore", validate_default=False)
+
 class ImageInputRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     base64: str
     mimeType: str
 
 class IdentifyItemsRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     images: List[ImageInputRequest]
 
 class IdentifyItemsResponse(BaseModel):
@@ -27,12 +58,24 @@ class IdentifyItemsResponse(BaseModel):
 class ItemCategoryResponse(BaseModel):
     category: str
 class ExtractItemRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     images: List[ImageInputRequest]
     item_name: str
 
 class ExtractItemResponse(BaseModel):
     base64_image: str
 
+class ExtractAllRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
+    images: List[ImageInputRequest]
+    item_names: List[str]
+
+class ExtractedItem(BaseModel):
+    name: str
+    base64_image: str
+
 @router.post("/identify", response_model=IdentifyItemsResponse)
 async def identify_items(
     request: IdentifyItemsRequest,
@@ -43,6 +86,9 @@ async def identify_items(
     Analyze room images and identify all furniture/decor items.
     Requires authentication.
     """
+    for img in request.images:
+        validate_image(img)
+
     try:
         # Convert request to ImageInput objects
         images = [ImageInput(base64=img.base64, mimeType=img.mimeType) for img in request.images]
@@ -58,7 +104,7 @@ async def identify_items(
         print(f"Error in identify endpoint: {e}")
         raise HTTPException(status_code=500, detail="Failed to identify items")
 
-@router.post("/extract", response_model=ExtractItemResponse)
+@router.post("/extract")
 async def extract_item(
     request: ExtractItemRequest,
     gemini_service: GeminiService = Depends(get_gemini_service),
@@ -66,20 +112,88 @@ async def extract_item(
 ):
     """
     Extract a specific item from room images as an isolated image.
+    Returns the raw PNG bytes (no base64/JSON blowup).
     Requires authentication.
     """
+    for img in request.images:
+        validate_image(img)
+
     try:
-        # Convert request to ImageInput objects
-        images = [ImageInput(base64=img.base64, mimeType=img.mimeType) for img in request.images]
-        
+        # Decode the base64 payloads once; the service takes raw bytes
+        images = [
+            {"data": base64.b64decode(img.base64), "mimeType": img.mimeType}
+            for img in request.images
+        ]
+
+        # Call Gemini service and ship the PNG bytes straight through
+        image_bytes = await gemini_service.extract_item_image_bytes(images, request.item_name)
+
+        return Response(content=image_bytes, media_type="image/png")
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in extract endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Failed to extract item")
+
+@router.post("/extract_base64", response_model=ExtractItemResponse)
+async def extract_item_base64(
+    request: ExtractItemRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    current_user: User = Depends(require_role_or_admin("designer"))
+):
+    """
+    Extract a specific item from room images as base64 JSON, for callers
+    that need to embed the image rather than fetch it.
+    Requires authentication.
+    """
+    for img in request.images:
+        validate_image(img)
+
+    try:
+        # Decode the base64 payloads once; the service takes raw bytes
+        images = [
+            {"data": base64.b64decode(img.base64), "mimeType": img.mimeType}
+            for img in request.images
+        ]
+
         # Call Gemini service
         base64_image = await gemini_service.extract_item_image(images, request.item_name)
-        
+
         return ExtractItemResponse(base64_image=base64_image)
-        
+
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"Error in extract endpoint: {e}")
         raise HTTPException(status_code=500, detail="Failed to extract item")
 
+@router.post("/extract_all", response_model=List[ExtractedItem])
+async def extract_all_items(
+    request: ExtractAllRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+    current_user: User = Depends(require_role_or_admin("designer"))
+):
+    """
+    Extract several items from the same room images in parallel.
+    Requires authentication.
+    """
+    for img in request.images:
+        validate_image(img)
+
+    try:
+        # Decode the base64 payloads once; the service takes raw bytes
+        images = [
+            {"data": base64.b64decode(img.base64), "mimeType": img.mimeType}
+            for img in request.images
+        ]
+
+        # All extractions run concurrently against Gemini
+        return await gemini_service.extract_items(images, request.item_names)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error in extract_all endpoint: {e}")
+        raise HTTPException(status_code=500, detail="Failed to extract items")
+
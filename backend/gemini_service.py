@@ -4,10 +4,13 @@ Handles image analysis using Google's Gemini AI models.
 """
 
 import os
-import json
+import orjson
 import base64 as b64
-import requests
-from typing import List
+import asyncio
+import hashlib
+import aiohttp
+from cachetools import LRUCache, TTLCache
+from typing import List, Optional
 from google import genai
 from google.genai import types
 from pydantic import BaseModel
@@ -25,6 +28,11 @@ def get_gemini_service() -> 'GeminiService':
         _gemini_service_instance = GeminiService()
     return _gemini_service_instance
 
+async def close_gemini_service():
+    """Close the singleton's HTTP session on app shutdown."""
+    if _gemini_service_instance is not None:
+        await _gemini_service_instance.close()
+
 class ImageInput(BaseModel):
     base64: str
     mimeType: str
@@ -46,23 +54,140 @@ class GeminiService:
         "description": "A descriptive name for a single furniture or decor item."
     }
 
+    # Prompts and request configs are constant per endpoint, so build them
+    # once at class definition instead of reallocating per call
+    CATEGORIZE_BATCH_PROMPT = (
+        "You are an expert furniture classifier. "
+        "For EACH of the provided images (in order), assign the single furniture item "
+        "shown to exactly ONE category from the following list:\n"
+        "[Sofas, Dining Chairs, Side Tables, Coffee Tables, Arm Chairs].\n\n"
+        "Rules:\n"
+        "- Always pick the SINGLE best matching category from that list.\n"
+        "- If you are unsure, pick the closest reasonable category from the list.\n"
+        "- Never invent new categories.\n"
+        "- Output only a valid JSON array of category strings, one per image, "
+        "in the same order as the images.\n"
+    )
+
+    CATEGORIZE_BATCH_CONFIG = types.GenerateContentConfig(
+        temperature=0.1,
+        response_mime_type="application/json",
+        response_schema=types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.STRING,
+                enum=["Sofas", "Dining Chairs", "Side Tables", "Coffee Tables", "Arm Chairs"]
+            )
+        )
+    )
+
+    # Normalization table for model output → canonical category names
+    ALLOWED_CATEGORIES = {
+        "sofas": "Sofas",
+        "sofa": "Sofas",
+        "dining chairs": "Dining Chairs",
+        "dining chair": "Dining Chairs",
+        "side tables": "Side Tables",
+        "side table": "Side Tables",
+        "coffee tables": "Coffee Tables",
+        "coffee table": "Coffee Tables",
+        "arm chairs": "Arm Chairs",
+        "arm chair": "Arm Chairs",
+    }
+
+    IDENTIFY_PROMPT = "Analyze the provided room images, which show different angles of the same room. Identify every distinct piece of furniture and lighting. Consolidate items seen from multiple angles to avoid duplicates and use colours to differentiate between items. Provide a short, unique, descriptive name for each item, and a subcategory for each item from this list [Dining Chairs,Side Tables,Coffee Tables,Arm Chairs]. Return the result as a JSON array of strings. If the item is two of something just extract one of it"
+
+    IDENTIFY_CONFIG = types.GenerateContentConfig(
+        temperature=0.3,
+        response_mime_type="application/json",
+        # A strict schema guarantees a parseable array of strings, so the
+        # caller never has to defend against prose-wrapped JSON
+        response_schema=types.Schema(
+            type=types.Type.ARRAY,
+            items=types.Schema(
+                type=types.Type.STRING,
+                description="A descriptive name for a single furniture or decor item."
+            )
+        )
+    )
+
+    EXTRACT_CONFIG = types.GenerateContentConfig(
+        temperature=0.4
+    )
+
 
     def __init__(self):
         """Initialize the Gemini service with API key from environment."""
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable is not set")
-        
-        self.client = genai.Client(api_key=api_key)
-    
-    def _file_to_generative_part(self, base64: str, mime_type: str):
-        """Convert base64 image to generative part format."""
-        return types.Part(
-            inline_data= {
-                "data": base64,
-                "mime_type": mime_type
-            }
+
+        # HTTP/2 lets concurrent generate_content calls multiplex over one
+        # persistent TLS connection instead of paying a handshake per call
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                client_args={"http2": True},
+                async_client_args={"http2": True}
+            )
         )
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Part cache: identify followed by per-item extract reuses the same
+        # images, so keep recently built Parts keyed by content hash
+        self._part_cache: LRUCache = LRUCache(maxsize=32)
+        # Response caches: re-analyzing the same room (or re-categorizing the
+        # same cut-out) is common during a design session, and a hit turns a
+        # multi-second Gemini round-trip into a dict lookup
+        self._identify_cache: TTLCache = TTLCache(maxsize=256, ttl=86400)
+        self._category_cache: TTLCache = TTLCache(maxsize=4096, ttl=86400)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Lazily create the shared HTTP session (needs a running event loop)."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def _fetch_image(self, url: str):
+        """Download an image asynchronously, returning (bytes, mime type)."""
+        async with self._get_session().get(url) as response:
+            response.raise_for_status()
+            return await response.read(), response.headers.get("Content-Type")
+
+    def _file_to_generative_part(self, data: bytes, mime_type: str):
+        """Convert raw image bytes to generative part format (cached by content hash)."""
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        part = self._part_cache.get(key)
+        if part is None:
+            part = types.Part.from_bytes(
+                data=data,
+                mime_type=mime_type or "image/png"
+            )
+            self._part_cache[key] = part
+        return part
+
+    @classmethod
+    def _normalize_category(cls, category: str) -> str:
+        """Map raw model output onto a canonical category name."""
+        normalized = (category or "").strip().lower()
+        result = cls.ALLOWED_CATEGORIES.get(normalized)
+
+        if result is None:
+            # Fallback: try loose matching
+            for key, value in cls.ALLOWED_CATEGORIES.items():
+                if key in normalized:
+                    return value
+
+            # As an absolute fallback, default to Arm Chairs to keep search working
+            result = "Arm Chairs"
+
+        return result
 
     async def categorize_item_from_url(self, image_url: str) -> str:
         """
@@ -81,69 +206,60 @@ class GeminiService:
         Returns:
             The predicted category string from the allowed list.
         """
-        try:
-            response = requests.get(image_url)
-            response.raise_for_status()
+        results = await self.categorize_items_from_urls([image_url])
+        return results[0]
 
-            img_base64 = b64.b64encode(response.content).decode("utf-8")
-            mime_type = response.headers.get("Content-Type", "image/png")
-            image_part = self._file_to_generative_part(img_base64, mime_type)
+    async def categorize_items_from_urls(self, image_urls: List[str]) -> List[str]:
+        """
+        Classify several item images in a single Gemini round-trip.
 
-            prompt = (
-                "You are an expert furniture classifier. "
-                "Look at the single furniture item in the image and assign it to exactly ONE category "
-                "from the following list:\n"
-                "[Sofas, Dining Chairs, Side Tables, Coffee Tables, Arm Chairs].\n\n"
-                "Rules:\n"
-                "- Always pick the SINGLE best matching category from that list.\n"
-                "- If you are unsure, pick the closest reasonable category from the list.\n"
-                "- Never invent new categories.\n"
-                "- Output only valid JSON of the form: {\"category\": \"Sofas\"}.\n"
-            )
+        N separate calls each pay ~half a second of fixed model latency;
+        batching collapses that into one call that returns a JSON array of
+        categories in image order.
 
-            result = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[prompt, image_part],
-                config=types.GenerateContentConfig(
-                    temperature=0.1,
-                    response_mime_type="application/json",
-                ),
-            )
+        Args:
+            image_urls: URLs of the item images, one item per image.
 
-            json_text = result.text.strip()
-            data = json.loads(json_text)
-            category = (data or {}).get("category", "")
-
-            allowed = {
-                "sofas": "Sofas",
-                "sofa": "Sofas",
-                "dining chairs": "Dining Chairs",
-                "dining chair": "Dining Chairs",
-                "side tables": "Side Tables",
-                "side table": "Side Tables",
-                "coffee tables": "Coffee Tables",
-                "coffee table": "Coffee Tables",
-                "arm chairs": "Arm Chairs",
-                "arm chair": "Arm Chairs",
-            }
-
-            normalized = category.strip().lower()
-            if normalized in allowed:
-                return allowed[normalized]
+        Returns:
+            Predicted category strings, in the same order as image_urls.
+        """
+        # Serve what we can from the cache and only ask Gemini for the rest
+        results = {url: self._category_cache.get(url) for url in image_urls}
+        missing = [url for url, category in results.items() if category is None]
+
+        if missing:
+            try:
+                downloads = await asyncio.gather(
+                    *(self._fetch_image(url) for url in missing)
+                )
+                image_parts = [
+                    self._file_to_generative_part(content, mime_type)
+                    for content, mime_type in downloads
+                ]
+
+                response = await self.client.aio.models.generate_content(
+                    model="gemini-2.5-flash",
+                    contents=[self.CATEGORIZE_BATCH_PROMPT, *image_parts],
+                    config=self.CATEGORIZE_BATCH_CONFIG,
+                )
 
-            # Fallback: try loose matching
-            for key, value in allowed.items():
-                if key in normalized:
-                    return value
+                categories = orjson.loads(response.text)
+                if not isinstance(categories, list) or len(categories) != len(missing):
+                    raise ValueError("Gemini returned a malformed category list.")
+
+                for url, category in zip(missing, categories):
+                    normalized = self._normalize_category(category)
+                    self._category_cache[url] = normalized
+                    results[url] = normalized
+
+            except Exception as error:
+                print(f"Error categorizing items from URLs: {error}")
+                # Surface a generic error so callers can decide what to do
+                raise ValueError("Failed to categorize item from image.")
+
+        return [results[url] for url in image_urls]
 
-            # As an absolute fallback, default to Arm Chairs to keep search working
-            return "Arm Chairs"
 
-        except Exception as error:
-            print(f"Error categorizing item from URL {image_url}: {error}")
-            # Surface a generic error so callers can decide what to do
-            raise ValueError("Failed to categorize item from image.")
-    
     async def identify_items(self, image_url: List[str]) -> List[str]:
         """
         Analyze room images and identify all furniture/decor items.
@@ -154,69 +270,65 @@ class GeminiService:
         Returns:
             List of identified item names
         """
+        cache_key = tuple(sorted(image_url))
+        cached = self._identify_cache.get(cache_key)
+        if cached is not None:
+            return list(cached)
+
         try:
-            images_base64 = []
-            for img_url in image_url:
-                response = requests.get(img_url)
-                response.raise_for_status()
-                # Convert image bytes to base64
-                img_base64 = b64.b64encode(response.content).decode('utf-8')
-                mime_type = response.headers.get("Content-Type")
-                images_base64.append({"base64": img_base64, "mimeType": mime_type})
-            
-            # Convert images to generative parts
+            # Download all images concurrently instead of one blocking
+            # requests.get per URL
+            downloads = await asyncio.gather(
+                *(self._fetch_image(img_url) for img_url in image_url)
+            )
+
+            # Convert images to generative parts (raw bytes, no base64 round-trip)
             image_parts = [
-                self._file_to_generative_part(img["base64"], img["mimeType"]) 
-                for img in images_base64
+                self._file_to_generative_part(content, mime_type)
+                for content, mime_type in downloads
             ]
 
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                 model="gemini-2.5-flash",
                 contents=[
-                    "Analyze the provided room images, which show different angles of the same room. Identify every distinct piece of furniture and lighting. Consolidate items seen from multiple angles to avoid duplicates and use colours to differentiate between items. Provide a short, unique, descriptive name for each item, and a subcategory for each item from this list [Dining Chairs,Side Tables,Coffee Tables,Arm Chairs]. Return the result as a JSON array of strings. If the item is two of something just extract one of it",
+                    self.IDENTIFY_PROMPT,
                     *image_parts
                 ],
-                config= types.GenerateContentConfig(
-                    temperature= 0.3,
-                    response_mime_type= "application/json",
-                    # response_schema=types.Schema(
-                    #     type=types.Type.ARRAY,
-                    #     items=types.Schema(
-                    #         type=types.Type.STRING,
-                    #         description="A descriptive name for a single furniture or decor item."
-                    #     )
-                    # )
-                )
+                config=self.IDENTIFY_CONFIG
             )
             
-            # Parse and return results
-            json_text = response.text.strip()
-            items = json.loads(json_text)
-            return items if isinstance(items, list) else []
+            # Parse and return results (orjson's C parser tolerates
+            # surrounding whitespace, so no strip pass is needed)
+            items = orjson.loads(response.text)
+            if not isinstance(items, list):
+                return []
+
+            self._identify_cache[cache_key] = items
+            return list(items)
             
         except Exception as error:
             print(f"Error identifying items: {error}")
             raise ValueError("Failed to identify items from the images. Please try different ones.")
 
 
-    async def extract_item_image(self, images: List[ImageInput], item_name: str) -> str:
+    async def extract_item_image_bytes(self, images: List[dict], item_name: str) -> bytes:
         """
         Extracts a specific item from room images into a new, isolated image.
 
         Args:
-            images: A list of dictionaries with base64 image data and MIME types.
+            images: A list of dictionaries with raw image bytes ("data") and MIME types.
             item_name: The name of the item to extract.
 
         Returns:
-            A base64-encoded PNG string of the extracted item image.
-            
+            The raw PNG bytes of the extracted item image.
+
         Raises:
             Exception: If the API fails or no image is returned.
         """
         try:
 
             # Convert image inputs.
-            image_parts = [self._file_to_generative_part(img['base64'], img['mimeType']) for img in images]
+            image_parts = [self._file_to_generative_part(img['data'], img['mimeType']) for img in images]
 
             # The prompt to guide the image generation.
             prompt = (
@@ -225,25 +337,22 @@ class GeminiService:
                 "be perfectly isolated with a transparent background and preferably be a front view of the item. Make sure the item is not cut off and is identical to the one present in the images."
             )
 
-            response = self.client.models.generate_content(
+            response = await self.client.aio.models.generate_content(
                     model="gemini-2.5-flash-image",
                     contents=[
                         prompt,
                         *image_parts
                     ],
-                    config= types.GenerateContentConfig(
-                        temperature= 0.4
-                    )
+                    config=self.EXTRACT_CONFIG
                 )
             
             # The response will contain image data in its 'parts'.
             for part in response.candidates[0].content.parts:
                 if part.inline_data and 'image' in part.inline_data.mime_type:
-                    # Convert the raw image bytes back to a base64 string for transport.
-                    image_bytes = part.inline_data.data
-                    base64_string = b64.b64encode(image_bytes).decode('utf-8')
-                    return base64_string
-            
+                    # Return the raw bytes untouched — callers that need
+                    # base64 encode at the edge
+                    return part.inline_data.data
+
             # If no image was found in the response parts.
             raise Exception("No image was extracted for this item.")
 
@@ -251,83 +360,39 @@ class GeminiService:
             print(f"Error extracting item '{item_name}': {e}")
             raise Exception(f"Failed to extract '{item_name}'.")
 
+    async def extract_item_image(self, images: List[dict], item_name: str) -> str:
+        """Like extract_item_image_bytes, but base64-encoded for JSON transport."""
+        image_bytes = await self.extract_item_image_bytes(images, item_name)
+        return b64.b64encode(image_bytes).decode('utf-8')
 
-    async def categorize_item_from_url(self, image_url: str) -> str:
-        """
-        Classify a single furniture item image into a subcategory.
 
-        The category must be ONE of:
-        - Sofas
-        - Dining Chairs
-        - Side Tables
-        - Coffee Tables
-        - Arm Chairs
+    async def extract_items(self, images: List[dict], item_names: List[str]) -> List[dict]:
+        """
+        Extract several items from the same room images concurrently.
 
         Args:
-            image_url: URL of the item image (ideally a cut-out of a single piece).
+            images: A list of dictionaries with raw image bytes ("data") and MIME types.
+            item_names: The names of the items to extract.
 
         Returns:
-            The predicted category string from the allowed list.
+            A list of {"name", "base64_image"} entries; items that failed are skipped.
         """
-        try:
-            response = requests.get(image_url)
-            response.raise_for_status()
+        # Bound concurrency so a big room doesn't blow through Gemini QPS limits
+        semaphore = asyncio.Semaphore(8)
 
-            img_base64 = b64.b64encode(response.content).decode("utf-8")
-            mime_type = response.headers.get("Content-Type", "image/png")
-            image_part = self._file_to_generative_part(img_base64, mime_type)
+        async def extract_one(name: str) -> str:
+            async with semaphore:
+                return await self.extract_item_image(images, name)
 
-            prompt = (
-                "You are an expert furniture classifier. "
-                "Look at the single furniture item in the image and assign it to exactly ONE category "
-                "from the following list:\n"
-                "[Sofas, Dining Chairs, Side Tables, Coffee Tables, Arm Chairs].\n\n"
-                "Rules:\n"
-                "- Always pick the SINGLE best matching category from that list.\n"
-                "- If you are unsure, pick the closest reasonable category from the list.\n"
-                "- Never invent new categories.\n"
-                "- Output only valid JSON of the form: {\"category\": \"Sofas\"}.\n"
-            )
-
-            result = self.client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[prompt, image_part],
-                config=types.GenerateContentConfig(
-                    temperature=0.1,
-                    response_mime_type="application/json",
-                ),
-            )
-
-            json_text = result.text.strip()
-            data = json.loads(json_text)
-            category = (data or {}).get("category", "")
-
-            allowed = {
-                "sofas": "Sofas",
-                "sofa": "Sofas",
-                "dining chairs": "Dining Chairs",
-                "dining chair": "Dining Chairs",
-                "side tables": "Side Tables",
-                "side table": "Side Tables",
-                "coffee tables": "Coffee Tables",
-                "coffee table": "Coffee Tables",
-                "arm chairs": "Arm Chairs",
-                "arm chair": "Arm Chairs",
-            }
-
-            normalized = category.strip().lower()
-            if normalized in allowed:
-                return allowed[normalized]
-
-            # Fallback: try loose matching
-            for key, value in allowed.items():
-                if key in normalized:
-                    return value
-
-            # As an absolute fallback, default to Arm Chairs to keep search working
-            return "Arm Chairs"
+        results = await asyncio.gather(
+            *(extract_one(name) for name in item_names),
+            return_exceptions=True
+        )
 
-        except Exception as error:
-            print(f"Error categorizing item from URL {image_url}: {error}")
-            # Surface a generic error so callers can decide what to do
-            raise ValueError("Failed to categorize item from image.")
\ No newline at end of file
+        extracted = []
+        for name, result in zip(item_names, results):
+            if isinstance(result, Exception):
+                print(f"Skipping item '{name}': {result}")
+                continue
+            extracted.append({"name": name, "base64_image": result})
+        return extracted
\ No newline at end of file
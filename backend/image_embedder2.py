@@ -1,10 +1,22 @@
-from transformers import AutoProcessor, AutoModelForCausalLM  
+from transformers import AutoProcessor, AutoModelForCausalLM
 import requests
+from requests.adapters import HTTPAdapter, Retry
+from cachetools import LRUCache
 from io import BytesIO
 from PIL import Image
 import copy
+import hashlib
+import os
 import torch
 
+# Shared session with keep-alive pooling: most item images live on the same
+# CDN host, so reusing sockets skips a TLS handshake per download
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                    max_retries=Retry(total=2, backoff_factor=0.2)))
+_HTTP.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                                   max_retries=Retry(total=2, backoff_factor=0.2)))
+
 MODEL_PRESETS = {
     'best': 'convnextv2_huge.fcmae_ft_in22k_in1k_384',
     'balanced': 'convnextv2_base.fcmae_ft_in22k_in1k_384',
@@ -16,40 +28,81 @@ MODEL_PRESETS = {
     'newbest': 'ViT-bigG-14::laion2B-s39B-b160K'
 }
 
+# Singleton instances per preset — a Florence-2 load costs minutes of hub
+# metadata calls and weight allocation, so never repeat it in one process
+_embedder_singletons = {}
+
+def get_image_embedder2(preset='semantic', device=None) -> 'ImageEmbedder2':
+    """Get or create a cached ImageEmbedder2 for the given preset."""
+    embedder = _embedder_singletons.get(preset)
+    if embedder is None:
+        embedder = _embedder_singletons[preset] = ImageEmbedder2(preset, device)
+    return embedder
+
 class ImageEmbedder2:
     def __init__(self, preset='semantic', device=None):
         # Custom model string in format "MODEL::PRETRAINED"
         model_id = MODEL_PRESETS.get(preset, "semantic")
         print(f"Loading model: {model_id}")
 
-        model = AutoModelForCausalLM.from_pretrained(model_id, trust_remote_code=True, torch_dtype='auto').eval().cuda()
-        processor = AutoProcessor.from_pretrained(model_id, trust_remote_code=True)
+        # Pin device and dtype once so the hot path never re-casts or
+        # re-copies tensors that are already where they belong
+        self.device = torch.device(device) if device else torch.device('cuda')
+        self.dtype = torch.float16
+
+        # With HF_OFFLINE=1 (weights already on the HF_HOME volume), skip the
+        # hub metadata round-trips entirely on warm starts
+        local_only = os.environ.get("HF_OFFLINE", "0") == "1"
+        model = AutoModelForCausalLM.from_pretrained(
+            model_id, trust_remote_code=True, torch_dtype=self.dtype,
+            local_files_only=local_only
+        ).eval().to(self.device)
+        processor = AutoProcessor.from_pretrained(
+            model_id, trust_remote_code=True, local_files_only=local_only)
 
         # --- Load model & preprocessing ---
         self.model = model
         self.processor = processor
 
+        # Content-addressed cache: recaptioning identical bytes is pure waste
+        # given how expensive a Florence-2 generate pass is
+        self._caption_cache = LRUCache(maxsize=4096)
+
         # --- Get embedding dimension ---
         print(f"✅ Model loaded successfully")
     
     def get_embedding(self, image_url):
         """Extract normalized embedding from a single image"""
         try:
-            response = requests.get(image_url, timeout=10)
+            response = _HTTP.get(image_url, timeout=10)
             response.raise_for_status()
+
+            cache_key = hashlib.blake2b(response.content, digest_size=16).digest()
+            cached = self._caption_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
             image = Image.open(BytesIO(response.content)).convert("RGB")
-            inputs = self.processor(text="<MORE_DETAILED_CAPTION>", images=image, return_tensors="pt").to('cuda', torch.float16)
+            inputs = self.processor(text="<MORE_DETAILED_CAPTION>", images=image, return_tensors="pt")
+            # One copy per tensor: ids stay int64, pixels cast to fp16 in flight
+            input_ids = inputs["input_ids"].to(self.device, non_blocking=True)
+            pixel_values = inputs["pixel_values"].to(self.device, self.dtype, non_blocking=True)
+            # Greedy decoding with a caption-sized budget: beam width 3 was
+            # tripling decoder work and 1024 tokens is far past caption length
             generated_ids = self.model.generate(
-                input_ids=inputs["input_ids"].cuda(),
-                pixel_values=inputs["pixel_values"].cuda(),
-                max_new_tokens=1024,
-                early_stopping=False,
+                input_ids=input_ids,
+                pixel_values=pixel_values,
+                max_new_tokens=128,
+                early_stopping=True,
                 do_sample=False,
-                num_beams=3
+                num_beams=1,
+                use_cache=True
             )
             generated_text = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-            
-            return generated_text.replace('</s>', '').replace('<s>', '').strip()
+
+            caption = generated_text.replace('</s>', '').replace('<s>', '').strip()
+            self._caption_cache[cache_key] = caption
+            return caption
 
         except Exception as e:
             print(f"❌ Error processing {image_url}: {e}")
@@ -1,5 +1,17 @@
+import asyncio
 import uuid
 import os
+from boto3.s3.transfer import TransferConfig
+
+# Pinecone caps upserts at 100 vectors per call
+UPSERT_BATCH_SIZE = 100
+
+# Stream uploads in 8 MiB multipart chunks with a few parts in flight
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4
+)
 
 class ImageUploader:
     def __init__(self, s3_client, bucket_name, embedder, index):
@@ -7,21 +19,31 @@ class ImageUploader:
         self.bucket_name = bucket_name
         self.embedder = embedder
         self.index = index
+        # Resolved once — env lookups were happening per uploaded file
+        self.r2_url = os.getenv('R2_URL', '')
+
+    async def _upload_file(self, file, folder_name):
+        # Generate unique filename with same extension
+        file_ext = os.path.splitext(file.filename)[1]
+        unique_name = f"{uuid.uuid4().hex}{file_ext}"
+
+        # Stream the spooled temp file straight to R2 instead of
+        # materializing the whole payload in RAM first
+        await file.seek(0)
+        await self.s3_client.upload_fileobj(
+            file.file,
+            self.bucket_name,
+            f"{folder_name}/{unique_name}",
+            ExtraArgs={"ContentType": file.content_type},
+            Config=_TRANSFER_CONFIG
+        )
+
+        file_url = f"{self.r2_url}/{folder_name}/{unique_name}"
+        return file_url, unique_name
 
     async def upload_image(self, file, folder_name):
         try:
-            file_bytes = await file.read()
-            # Generate unique filename with same extension
-            file_ext = os.path.splitext(file.filename)[1]
-            unique_name = f"{uuid.uuid4().hex}{file_ext}"
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=f"{folder_name}/{unique_name}",
-                Body=file_bytes,
-                ContentType=file.content_type
-            )
-
-            file_url = f"{os.getenv('R2_URL')}/{f"{folder_name}/{unique_name}"}"
+            file_url, _ = await self._upload_file(file, folder_name)
             return file_url
         except Exception as e:
             print(f"Failed to upload image {file.filename}: {e}")
@@ -43,13 +65,13 @@ class ImageUploader:
             }
             content_type = "image/png"
             
-            self.s3_client.put_object(
+            await self.s3_client.put_object(
                 Bucket=self.bucket_name,
                 Key=f"{folder_name}/{unique_name}",
                 Body=data,
                 ContentType=content_type
             )
-            file_url = f"{os.getenv('R2_URL')}/{folder_name}/{unique_name}"
+            file_url = f"{self.r2_url}/{folder_name}/{unique_name}"
             return file_url
         except Exception as e:
             print(f"Failed to upload bytes: {e}")
@@ -61,7 +83,7 @@ class ImageUploader:
             # Extract the key from the URL
             # URL format: https://r2-url.com/projects/123/abc123.jpg
             # We need: projects/123/abc123.jpg
-            r2_url = os.getenv('R2_URL', '')
+            r2_url = self.r2_url
             if not r2_url or not file_url.startswith(r2_url):
                 print(f"Invalid R2 URL format: {file_url}")
                 return False
@@ -70,7 +92,7 @@ class ImageUploader:
             key = file_url.replace(r2_url + '/', '')
             
             # Delete the object from R2
-            self.s3_client.delete_object(
+            await self.s3_client.delete_object(
                 Bucket=self.bucket_name,
                 Key=key
             )
@@ -81,55 +103,111 @@ class ImageUploader:
             return False
 
     async def add_furniture_item(self, file, metadata):
-        try:
-            file_url = await self.upload_image(file, "furniture")
-            
-            embedding = self.embedder.get_embedding(file_url)
+        results = await self.add_furniture_items([file], [metadata])
+        return results[0]
+
+    async def add_furniture_items(self, files, metadatas):
+        """Upload a batch of files and index them in bulk.
+
+        The bytes are embedded directly in one batched forward pass — no
+        re-download from R2 — and the R2 PUTs run concurrently with the
+        embedding since neither depends on the other. All vectors then go
+        to Pinecone in a single upsert.
+
+        Returns a list of per-file success flags, in input order.
+        """
+        results = [False] * len(files)
+
+        # (position, vector id, url, bytes, metadata, content type)
+        entries = []
+        for i, (file, metadata) in enumerate(zip(files, metadatas)):
+            try:
+                file_bytes = await file.read()
+                file_ext = os.path.splitext(file.filename)[1]
+                unique_name = f"{uuid.uuid4().hex}{file_ext}"
+                file_url = f"{self.r2_url}/furniture/{unique_name}"
+                entries.append((i, unique_name, file_url, file_bytes, metadata,
+                                file.content_type))
+            except Exception as e:
+                print(f"Failed to read image {file.filename}: {e}")
+
+        if not entries:
+            return results
+
+        async def _put(unique_name, data, content_type):
+            await self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=f"furniture/{unique_name}",
+                Body=data,
+                ContentType=content_type
+            )
+
+        # The R2 PUTs fan out on the event loop while the GPU forward runs
+        # in a worker thread; everything completes together
+        embeddings, *put_results = await asyncio.gather(
+            asyncio.to_thread(self.embedder.get_embeddings_from_bytes,
+                              [entry[3] for entry in entries]),
+            *(_put(unique_name, data, content_type)
+              for _, unique_name, _, data, _, content_type in entries),
+            return_exceptions=True
+        )
+
+        if isinstance(embeddings, BaseException):
+            print(f"Failed to embed images: {embeddings}")
+            return results
+
+        vectors = []
+        for entry, embedding, put_result in zip(entries, embeddings, put_results):
+            i, unique_name, file_url, _, metadata, _ = entry
+            if isinstance(put_result, BaseException):
+                print(f"Failed to upload image {unique_name}: {put_result}")
+                continue
             if embedding is None:
                 print(f"Failed to get embedding for image {unique_name}")
-                return False
-            
+                continue
             metadata["image_url"] = file_url
-            
-            self.index.upsert(
-                vectors=[
-                    {
-                    "id": unique_name, 
-                    "values": embedding.tolist(), 
-                    "metadata": metadata
-                    }
-                ],
-                namespace="__default__"
-            )
-            return True
-        
-        except Exception as e:
-            print(f"Failed to upload image {unique_name}: {e}")
-            return False
-        
+            vectors.append({
+                "id": unique_name,
+                # 5 decimals is below fp32 noise for unit vectors but
+                # roughly halves the JSON the REST client ships per vector
+                "values": [round(float(v), 5) for v in embedding],
+                "metadata": metadata
+            })
+            results[i] = True
+
+        if vectors:
+            try:
+                # ceil(N/100) parallel round-trips; the sync client runs in
+                # worker threads so the loop stays free
+                await asyncio.gather(*(
+                    asyncio.to_thread(self.index.upsert,
+                                      vectors=vectors[start:start + UPSERT_BATCH_SIZE],
+                                      namespace="__default__")
+                    for start in range(0, len(vectors), UPSERT_BATCH_SIZE)
+                ))
+            except Exception as e:
+                print(f"Failed to upsert vectors: {e}")
+                return [False] * len(files)
+
+        return results
+
+
 
     async def search_item(self, file):
         try:
             file_bytes = await file.read()
-            # Generate unique filename with same extension
-            file_ext = os.path.splitext(file.filename)[1]
-            unique_name = f"{uuid.uuid4().hex}{file_ext}"
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=unique_name,
-                Body=file_bytes,
-                ContentType=file.content_type
-            )
 
-            file_url = f"{os.getenv('R2_URL')}/{unique_name}"
-            
-            embedding = self.embedder.get_embedding(file_url)
+            # Embed straight from the query bytes — the old path uploaded the
+            # query image to R2 only to download it back for embedding
+            embedding = await asyncio.to_thread(
+                self.embedder.get_embedding_from_bytes, file_bytes
+            )
             if embedding is None:
-                print(f"Failed to get embedding for image {unique_name}")
+                print(f"Failed to get embedding for image {file.filename}")
                 return False
-    
+
             return embedding
-        
+
         except Exception as e:
-            print(f"Failed to upload image {unique_name}: {e}")
+            print(f"Failed to embed search image {file.filename}: {e}")
             return False
\ No newline at end of file
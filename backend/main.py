@@ -1,17 +1,20 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Depends, Form
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
+import asyncio
 import torch
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 import os
 import json
+import httpx
+from pinecone_utils import get_index_stats
 from pinecone import Pinecone
 from dotenv import load_dotenv
 from image_embedder import ImageEmbedder
 from image_embedder2 import ImageEmbedder2
 from image_embedder3 import ImageEmbedder3
 from image_uploader import ImageUploader
-import boto3
+import aioboto3
 
 # Authentication imports
 from database import init_database, init_default_data, close_database
@@ -19,6 +22,7 @@ from auth_routes import router as auth_router
 from admin_routes import router as admin_router
 from projects_routes import router as projects_router
 # from gemini_routes import router as gemini_router
+from gemini_service import close_gemini_service
 from auth_dependencies import require_search_permission, require_upload_permission, require_stats_permission
 
 
@@ -31,6 +35,14 @@ async def lifespan(app: FastAPI):
     """Handles startup and shutdown events cleanly."""
     print("🚀 Starting up...")
 
+    # Shared async HTTP client for outbound image fetches — keep-alive
+    # (and HTTP/2 multiplexing) amortize TLS setup across downloads
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=15.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
     # --- Initialize MongoDB Database ---
     print("📊 Initializing MongoDB database...")
     try:
@@ -40,6 +52,7 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"❌ Error initializing MongoDB: {e}")
         yield
+        await app.state.http.aclose()
         return
 
     # --- Initialize Embedder ---
@@ -48,6 +61,14 @@ async def lifespan(app: FastAPI):
         model_preset = os.getenv("MODEL_PRESET", "balanced")
         app.state.embedder = ImageEmbedder3(preset=model_preset, device=device)
         print(f"✅ Embedder loaded with preset: {model_preset}")
+
+        # Hide first-inference stalls (CUDA init, autotune, graph capture)
+        # behind startup instead of the first real search
+        try:
+            app.state.embedder.warmup()
+            print("✅ Embedder warmed up")
+        except Exception as e:
+            print(f"⚠️ Warning: embedder warmup failed: {e}")
     except Exception as e:
         print(f"⚠️ Warning: Could not load embedder: {e}")
         print("   App will work but image search/upload may fail")
@@ -62,34 +83,41 @@ async def lifespan(app: FastAPI):
     else:
         try:
             pc = Pinecone(api_key=pinecone_api_key)
-            
-            # Check if index exists
-            if pinecone_index_name not in pc.list_indexes().names():
+
+            # Check if index exists (sync client calls go through worker
+            # threads so the loop can keep serving during startup)
+            index_names = await asyncio.to_thread(lambda: pc.list_indexes().names())
+            if pinecone_index_name not in index_names:
                 print(f"⚠️ Warning: Index '{pinecone_index_name}' does not exist in Pinecone")
             else:
                 app.state.pinecone = pc
                 app.state.pinecone_index = pc.Index(pinecone_index_name)
-                stats = app.state.pinecone_index.describe_index_stats()
+                stats = await get_index_stats(app.state.pinecone_index)
                 print(f"✅ Connected to Pinecone. Vectors: {stats['total_vector_count']}")
         except Exception as e:
             print(f"⚠️ Error initializing Pinecone: {e}")
 
     # --- Initialize Cloudflare R2 ---
     print("☁️  Initializing Cloudflare R2...")
+    app.state.r2_stack = AsyncExitStack()
     try:
         r2_account_id = os.getenv("R2_ACCOUNT_ID")
         r2_access_key = os.getenv("R2_ACCESS_KEY_ID")
         r2_secret_key = os.getenv("R2_SECRET_ACCESS_KEY")
-        
+
         if not all([r2_account_id, r2_access_key, r2_secret_key]):
             print("⚠️ Warning: R2 credentials incomplete")
         else:
-            r2_client = boto3.client(
-                "s3",
-                endpoint_url=f"https://{r2_account_id}.r2.cloudflarestorage.com",
-                aws_access_key_id=r2_access_key,
-                aws_secret_access_key=r2_secret_key,
-                region_name=os.getenv("R2_REGION", "auto"),
+            # Async S3 client: PUT/DELETE calls await on the event loop
+            # instead of blocking it, so uploads can fan out concurrently
+            r2_client = await app.state.r2_stack.enter_async_context(
+                aioboto3.Session().client(
+                    "s3",
+                    endpoint_url=f"https://{r2_account_id}.r2.cloudflarestorage.com",
+                    aws_access_key_id=r2_access_key,
+                    aws_secret_access_key=r2_secret_key,
+                    region_name=os.getenv("R2_REGION", "auto"),
+                )
             )
             app.state.r2 = r2_client
             app.state.r2_bucket = os.getenv("R2_BUCKET_NAME")
@@ -114,6 +142,9 @@ async def lifespan(app: FastAPI):
     
     # --- Cleanup on shutdown ---
     print("🛑 Shutting down...")
+    await close_gemini_service()
+    await app.state.http.aclose()
+    await app.state.r2_stack.aclose()
     await close_database()
 
 app = FastAPI(
@@ -144,10 +175,11 @@ async def root(request: Request):
     pinecone_index = request.app.state.pinecone_index
     if pinecone_index:
         try:
-            stats = pinecone_index.describe_index_stats()
-        except:
+            stats = await get_index_stats(pinecone_index)
+        except Exception:
             pass
-    
+
+
     return {
         "status": "online",
         "model": "loaded" if embedder else "not loaded",
@@ -180,19 +212,21 @@ async def upload_images(
             except json.JSONDecodeError:
                 pass
         
-        vectors_to_upsert = []        
-        for i, file in enumerate(files):
-            file_metadata = metadata_list[i] if i < len(metadata_list) else {}
-            success = await uploader.add_furniture_item(file, file_metadata)
-            if success:
-                vectors_to_upsert.append(file.filename)
-        
-        stats = pinecone_index.describe_index_stats()
-        
+        per_file_metadata = [
+            metadata_list[i] if i < len(metadata_list) else {}
+            for i in range(len(files))
+        ]
+
+        # One batched embed + one Pinecone upsert for the whole request
+        results = await uploader.add_furniture_items(files, per_file_metadata)
+        uploaded = sum(1 for success in results if success)
+
+        stats = await get_index_stats(pinecone_index, refresh=True)
+
         return {
             "success": True,
-            "uploaded": len(vectors_to_upsert),
-            "failed": len(files) - len(vectors_to_upsert),
+            "uploaded": uploaded,
+            "failed": len(files) - uploaded,
             "total_database_size": stats['total_vector_count']
         }
     except Exception as e:
@@ -209,7 +243,7 @@ async def get_database_stats(
         raise HTTPException(status_code=500, detail="Pinecone not connected")
     
     try:
-        stats = pinecone_index.describe_index_stats()
+        stats = await get_index_stats(pinecone_index)
         return {
             "total_images": stats['total_vector_count'],
             "dimension": stats.get('dimension', 0),
@@ -222,4 +256,6 @@ async def get_database_stats(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # uvloop's libuv-based loop is markedly faster than the stdlib selector
+    # loop for the Mongo/Gemini/client I/O this app is made of
+    uvicorn.run(app, host="0.0.0.0", port=8080, loop="uvloop", http="httptools")
\ No newline at end of file
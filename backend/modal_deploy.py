@@ -20,13 +20,14 @@ image = (
             "python-dotenv",
             "boto3",
             "botocore",
+            "aioboto3",
             "pinecone[asyncio]",
             "transformers==4.49.0",
             "huggingface-hub",
             "open-clip-torch",
             # Authentication dependencies
             "python-jose[cryptography]",
-            "passlib[argon2]",
+            "passlib[argon2,bcrypt]",
             "motor",
             "pymongo",
             "pydantic",
@@ -35,9 +36,23 @@ image = (
             "beanie",
             "certifi",
             "google-genai",
-            "einops"
+            "einops",
+            "cachetools",
+            "orjson",
+            "aiohttp",
+            "httpx[http2]"
         ]
     )
+    # Persist compiled-kernel artifacts and model weights on the data
+    # volume so cold starts skip both inductor compilation and the
+    # multi-GB checkpoint downloads
+    .env({
+        "TORCHINDUCTOR_CACHE_DIR": "/data/inductor_cache",
+        "HF_HOME": "/data/hf",
+        "HUGGINGFACE_HUB_CACHE": "/data/hf/hub",
+        "TORCH_HOME": "/data/torch",
+        "OPENCLIP_CACHEDIR": "/data/openclip",
+    })
     # ✅ Copy everything in your current folder into /root/app
     .add_local_dir(".", "/root/app")
 )
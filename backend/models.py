@@ -1,12 +1,15 @@
 from beanie import Document, Indexed
-from pydantic import Field, EmailStr, ConfigDict, model_serializer
+from pydantic import Field, ConfigDict, field_serializer
+from pymongo import IndexModel
 from typing import List, Optional, Annotated
 from datetime import datetime
 from bson import ObjectId
 
 class User(Document):
     username: Indexed(str, unique=True)
-    email: Indexed(EmailStr, unique=True)
+    # Plain str: shape validation happens at the API boundary (schemas.Email),
+    # and a stricter model check would 500 on input the schema already accepted
+    email: Indexed(str, unique=True)
     hashed_password: str
     firstName: Optional[str] = ""  # Legacy support: empty string default
     lastName: Optional[str] = ""  # Legacy support: empty string default
@@ -20,24 +23,28 @@ class User(Document):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
     role_ids: List[ObjectId] = Field(default_factory=list)
-    
+    role_names: List[str] = Field(default_factory=list)  # Denormalized from roles for fast role checks
+
     model_config = ConfigDict(arbitrary_types_allowed=True)
-    
-    def model_dump(self, **kwargs):
-        """Override to convert ObjectIds to strings"""
-        data = super().model_dump(**kwargs)
-        # Convert ObjectId fields to strings for API response
-        if 'id' in data and isinstance(data['id'], ObjectId):
-            data['id'] = str(data['id'])
-        if 'role_ids' in data:
-            data['role_ids'] = [str(rid) if isinstance(rid, ObjectId) else rid for rid in data['role_ids']]
-        return data
-    
+
+    # ObjectId→str runs inside pydantic-core instead of a Python
+    # post-processing pass over every dumped user
+    @field_serializer('id', when_used='unless-none')
+    def _serialize_id(self, v) -> str:
+        return str(v)
+
+    @field_serializer('role_ids')
+    def _serialize_role_ids(self, v) -> List[str]:
+        return [str(rid) for rid in v]
+
+
     class Settings:
         name = "users"
         indexes = [
-            "username",
-            "email",
+            IndexModel([("username", 1)], unique=True),
+            IndexModel([("email", 1)], unique=True),
+            # Text index backing the admin user search
+            IndexModel([("username", "text"), ("email", "text")]),
             "is_active",
             "is_verified"
         ]
@@ -53,7 +60,7 @@ class Role(Document):
     class Settings:
         name = "roles"
         indexes = [
-            "name"
+            IndexModel([("name", 1)], unique=True)
         ]
 
 class Permission(Document):
@@ -86,14 +93,18 @@ class Token(Document):
     class Settings:
         name = "tokens"
         indexes = [
-            "token",
-            "user_id",
-            "is_revoked",
-            "expires_at"
+            # Uniqueness lives on the single-field token index (the Indexed
+            # annotation above); making the triple unique would still allow
+            # the same token as both revoked and non-revoked rows. This one
+            # just covers the refresh lookup.
+            IndexModel([("token", 1), ("is_revoked", 1), ("expires_at", 1)]),
+            IndexModel([("user_id", 1), ("is_revoked", 1)]),
+            # TTL index: Mongo purges expired tokens automatically
+            IndexModel([("expires_at", 1)], expireAfterSeconds=0)
         ]
 
 class Project(Document):
-    name: Indexed(str)
+    name: str  # Indexed via the compound (user_id, name) index below
     user_id: ObjectId
     photo_urls: List[str] = Field(default_factory=list)
     extracted_items: List[dict] = Field(default_factory=list)  # {name, url}
@@ -105,6 +116,10 @@ class Project(Document):
     class Settings:
         name = "projects"
         indexes = [
-            "user_id",
-            "name"
+            # Every handler filters by user_id plus _id or name; compound
+            # indexes serve those as single walks instead of intersecting
+            # two single-field indexes. Unique enforces one name per user
+            # at the DB level.
+            IndexModel([("user_id", 1), ("name", 1)], unique=True),
+            IndexModel([("user_id", 1), ("_id", 1)])
         ]
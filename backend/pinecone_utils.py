@@ -0,0 +1,20 @@
+import asyncio
+from cachetools import TTLCache
+
+# describe_index_stats is a full Pinecone round-trip and the vector count
+# is purely informational — a short TTL keeps it off the hot path
+_stats_cache = TTLCache(maxsize=1, ttl=30)
+
+async def get_index_stats(pinecone_index, refresh=False):
+    """Return describe_index_stats, cached for a few seconds.
+
+    The sync client call runs in a worker thread so the event loop stays
+    free. Pass refresh=True after writes so the reported count moves.
+    """
+    if refresh:
+        _stats_cache.pop("stats", None)
+    stats = _stats_cache.get("stats")
+    if stats is None:
+        stats = await asyncio.to_thread(pinecone_index.describe_index_stats)
+        _stats_cache["stats"] = stats
+    return stats
@@ -1,56 +1,116 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, status, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Response, status, Form
+from fastapi.responses import ORJSONResponse
 from typing import List, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
-import requests
-import base64 as b64
-import json
-from pydantic import BaseModel
+import asyncio
+import orjson
+from beanie import PydanticObjectId
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 from models import Project, User
-from schemas import ProjectCreate, ProjectResponse
+from pinecone_utils import get_index_stats
+from schemas import ProjectCreate, ProjectListResponse, ProjectResponse
 from auth_dependencies import require_role_or_admin, require_search_permission
 from gemini_service import get_gemini_service
+from task_utils import spawn
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
 class DeletePhotoRequest(BaseModel):
     photo_url: str
 
+class SearchHit(BaseModel):
+    id: str
+    similarity_score: float
+    metadata: dict = Field(default_factory=dict)
+    image_path: str = ""
+    filename: str = ""
+
+class SearchQueryResult(BaseModel):
+    query_identifier: str
+    success: bool
+    error: Optional[str] = None
+    results: List[SearchHit] = Field(default_factory=list)
+
+class SearchResponse(BaseModel):
+    success: bool
+    total_queries: int
+    results: List[SearchQueryResult]
+    total_database_size: int
+
+class ProjectListProjection(BaseModel):
+    """Projection for the list view: Mongo ships only these fields, so the
+    potentially large photo_urls/extracted_items arrays never cross the
+    wire or go through validation."""
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    user_id: ObjectId
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+# Built once at import: pydantic-core does the attribute walk (ObjectId
+# stringification included) in Rust instead of a Python constructor call
+# per document
+_PROJECT_ADAPTER = TypeAdapter(ProjectResponse)
+_PROJECT_LIST_ADAPTER = TypeAdapter(List[ProjectListResponse])
+_SEARCH_ADAPTER = TypeAdapter(SearchResponse)
+
 def project_to_dict(project: Project) -> ProjectResponse:
-    return ProjectResponse(
-        id=str(project.id),
-        name=project.name,
-        user_id=str(project.user_id),
-        photo_urls=project.photo_urls,
-        extracted_items=project.extracted_items,
-        created_at=project.created_at,
-        updated_at=project.updated_at,
+    return _PROJECT_ADAPTER.validate_python(project, from_attributes=True)
+
+def _oid(value: str) -> ObjectId:
+    """Reject malformed ids before spending a Mongo round-trip on them."""
+    if not ObjectId.is_valid(value):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
+    return ObjectId(value)
+
+async def get_owned_project(
+    project_id: str,
+    current_user: User = Depends(require_role_or_admin("designer"))
+) -> Project:
+    """Fetch the project owned by the caller, or 400/404.
+
+    Shared by the designer routes so the id check and ownership query run
+    once instead of being copy-pasted per handler. The query sits outside
+    any try block: DB errors surface as 500s instead of masquerading as
+    'invalid project id'.
+    """
+    project = await Project.find_one(
+        Project.id == _oid(project_id), Project.user_id == current_user.id
     )
+    if not project:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
 
-@router.get("/", response_model=List[ProjectResponse])
+@router.get("/")
 async def list_projects(current_user: User = Depends(require_role_or_admin("designer"))):
-    projects = await Project.find(Project.user_id == current_user.id).to_list()
-    return [project_to_dict(p) for p in projects]
+    projects = await Project.find(
+        Project.user_id == current_user.id
+    ).project(ProjectListProjection).to_list()
+    rows = _PROJECT_LIST_ADAPTER.validate_python(projects, from_attributes=True)
+    # Straight model→JSON in pydantic-core; skips FastAPI's
+    # model→dict→json.dumps re-serialization of the whole list
+    return Response(content=_PROJECT_LIST_ADAPTER.dump_json(rows),
+                    media_type="application/json")
 
 @router.post("/", response_model=ProjectResponse)
 async def create_project(data: ProjectCreate, current_user: User = Depends(require_role_or_admin("designer"))):
-    # Optional: enforce unique name per user
-    existing = await Project.find_one(Project.user_id == current_user.id, Project.name == data.name)
-    if existing:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Project name already exists")
     project = Project(name=data.name, user_id=current_user.id)
-    await project.insert()
+    # The unique (user_id, name) index enforces per-user names — insert
+    # and catch instead of a racy existence pre-check round-trip
+    try:
+        await project.insert()
+    except DuplicateKeyError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Project name already exists")
     return project_to_dict(project)
 
 @router.get("/{project_id}", response_model=ProjectResponse)
-async def get_project(project_id: str, current_user: User = Depends(require_role_or_admin("designer"))):
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+async def get_project(project: Project = Depends(get_owned_project)):
     return project_to_dict(project)
 
 @router.post("/{project_id}/photos", response_model=ProjectResponse)
@@ -58,25 +118,18 @@ async def upload_project_photos(
     request: Request,
     project_id: str,
     files: List[UploadFile] = File(...),
-    current_user: User = Depends(require_role_or_admin("designer"))
+    project: Project = Depends(get_owned_project)
 ):
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-
-
     uploader = request.app.state.uploader
     if uploader is None:
         raise HTTPException(status_code=500, detail="Uploader service not available")
     
-    uploaded_urls: List[str] = []
-    for file in files:
-        file_url = await uploader.upload_image(file, f"projects/{project_id}")
-        if file_url:
-            uploaded_urls.append(file_url)
+    # Overlap the R2 round-trips instead of paying them one at a time;
+    # upload_image already swallows per-file failures into None
+    results = await asyncio.gather(
+        *(uploader.upload_image(file, f"projects/{project_id}") for file in files)
+    )
+    uploaded_urls: List[str] = [url for url in results if url]
 
     project.photo_urls.extend(uploaded_urls)
     project.updated_at = datetime.utcnow()
@@ -86,37 +139,29 @@ async def upload_project_photos(
 @router.delete("/{project_id}/photos", response_model=ProjectResponse)
 async def delete_project_photo(
     request: Request,
-    project_id: str,
     data: DeletePhotoRequest,
-    current_user: User = Depends(require_role_or_admin("designer"))
+    project: Project = Depends(get_owned_project)
 ):
     """Delete a photo URL from the project's photo_urls list and from R2 storage."""
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    
-    # Remove the photo URL from the list if it exists
-    if data.photo_url in project.photo_urls:
-        # Delete from R2 storage first
-        uploader = request.app.state.uploader
-        if uploader:
-            try:
-                await uploader.delete_image(data.photo_url)
-            except Exception as r2_error:
-                # Log error but continue with DB deletion
-                print(f"Warning: Failed to delete from R2 storage: {r2_error}")
-        
-        # Remove from database
-        project.photo_urls.remove(data.photo_url)
-        project.updated_at = datetime.utcnow()
-        await project.save()
-    else:
+    # One atomic $pull instead of read-modify-save: no race with
+    # concurrent uploads and no rewrite of the whole document. Matching
+    # on photo_urls makes a missing photo show up as no document.
+    doc = await Project.get_motor_collection().find_one_and_update(
+        {"_id": project.id, "photo_urls": data.photo_url},
+        {"$pull": {"photo_urls": data.photo_url},
+         "$set": {"updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found in project")
-    
-    return project_to_dict(project)
+
+    # The DB is the source of truth; R2 cleanup runs in the background so
+    # the response doesn't wait on it (failures were only logged before)
+    uploader = request.app.state.uploader
+    if uploader:
+        spawn(uploader.delete_image(data.photo_url))
+
+    return project_to_dict(Project.model_validate(doc))
 
 @router.post("/{project_id}/identify")
 async def identify_project_items(
@@ -124,17 +169,10 @@ async def identify_project_items(
     project_id: str,
     files: Optional[List[UploadFile]] = File(None),
     urls: Optional[str] = Form(None),
-    current_user: User = Depends(require_role_or_admin("designer")),
+    project: Project = Depends(get_owned_project),
     gemini_service = Depends(get_gemini_service)
 ):
     """Identify furniture items from project photos (uploads files if provided, then identifies items using URLs)."""
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    
     uploader = request.app.state.uploader
     if uploader is None:
         raise HTTPException(status_code=500, detail="Uploader service not available")
@@ -143,25 +181,26 @@ async def identify_project_items(
     image_urls = []
     # If files are provided, upload them first and add URLs
     if files:
-        uploaded_urls: List[str] = []
-        for file in files:
-            file_url = await uploader.upload_image(file, f"projects/{project_id}")
-            if file_url:
-                uploaded_urls.append(file_url)
-                image_urls.append(file_url)
-        
+        results = await asyncio.gather(
+            *(uploader.upload_image(file, f"projects/{project_id}") for file in files)
+        )
+        uploaded_urls: List[str] = [url for url in results if url]
+        image_urls.extend(uploaded_urls)
+
+
         # Update project with new photos
         if uploaded_urls:
             project.photo_urls.extend(uploaded_urls)
             project.updated_at = datetime.utcnow()
             await project.save()
     
-    # Parse and add provided URLs
+    # Parse and add provided URLs (Form fields are always str, so no
+    # isinstance dance; orjson parses in a fraction of stdlib json's time)
     if urls:
         try:
-            url_list = json.loads(urls) if isinstance(urls, str) else urls
-            image_urls.extend(url_list)
-        except json.JSONDecodeError:
+            parsed = orjson.loads(urls)
+            image_urls.extend(parsed if isinstance(parsed, list) else [urls])
+        except orjson.JSONDecodeError:
             # Single URL as string
             image_urls.append(urls)
     
@@ -186,18 +225,10 @@ async def extract_project_items(
     item_name: str = Form(...),
     files: Optional[List[UploadFile]] = File(None),
     urls: Optional[str] = Form(None),
-    current_user: User = Depends(require_role_or_admin("designer")),
+    project: Project = Depends(get_owned_project),
     gemini_service = Depends(get_gemini_service)
 ):
     """Identify furniture items from project photos (uploads files if provided, then identifies items using URLs)."""
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
-    if not project:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
-    
-
     # Collect all image URLs
     image_urls = project.photo_urls
     
@@ -207,27 +238,29 @@ async def extract_project_items(
     
     # Call Gemini service to identify items
     try:
-        images_base64 = []
-        for img_url in image_urls:
-            response = requests.get(img_url)
+        # Fetch all photos concurrently on the shared async client —
+        # blocking requests.get here used to freeze the event loop per image
+        http = request.app.state.http
+        responses = await asyncio.gather(*(http.get(url) for url in image_urls))
+        images = []
+        for response in responses:
             response.raise_for_status()
-            # Convert image bytes to base64
-            img_base64 = b64.b64encode(response.content).decode('utf-8')
+            # Raw bytes go straight to the Gemini SDK (no base64 round-trip)
             mime_type = response.headers.get("Content-Type")
-            images_base64.append({"base64": img_base64, "mimeType": mime_type})
-        
-        item_base64 = await gemini_service.extract_item_image(images_base64, item_name)
+            images.append({"data": response.content, "mimeType": mime_type})
+        # Drop the response objects so only one copy of each photo stays alive
+        del responses
+
+        # Raw bytes end to end: the base64 encode/decode pair held a
+        # second full copy of the extracted image for no reason
+        item_bytes = await gemini_service.extract_item_image_bytes(images, item_name)
 
-        
         uploader = request.app.state.uploader
         if uploader is None:
             raise HTTPException(status_code=500, detail="Uploader service not available")
-        
+
         saved = []
-        
-        # Decode base64 string to bytes
-        item_bytes = b64.b64decode(item_base64)
-        
+
         uploaded_url = await uploader.upload_bytes(item_bytes, f"projects/{project_id}/extracted", filename="image.png")
         if uploaded_url:
             saved.append({"name": item_name, "url": uploaded_url})
@@ -246,19 +279,22 @@ async def extract_project_items(
         raise HTTPException(status_code=500, detail="Failed to extract item")
 
 
-@router.post("/{project_id}/search")
+# orjson encodes the large nested results dict several times faster than
+# the default stdlib-json response class
+@router.post("/{project_id}/search", response_class=ORJSONResponse)
 async def search_similar(
     request: Request, 
     project_id: str,
     urls: Optional[str] = Form(None),
-    top_k: int = Form(5),
+    # Bounds enforced declaratively — bad values get a 422 before the
+    # handler body runs
+    top_k: int = Form(5, ge=1, le=100),
     current_user = Depends(require_search_permission),
     gemini_service = Depends(get_gemini_service)
 ):
-    try:
-        project = await Project.find_one(Project.id == ObjectId(project_id), Project.user_id == current_user.id)
-    except:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid project id")
+    project = await Project.find_one(
+        Project.id == _oid(project_id), Project.user_id == current_user.id
+    )
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
@@ -274,92 +310,88 @@ async def search_similar(
     url_list = []
     if urls:
         try:
-            url_list = json.loads(urls) if isinstance(urls, str) else urls
-        except json.JSONDecodeError:
+            parsed = orjson.loads(urls)
+            url_list = parsed if isinstance(parsed, list) else [urls]
+        except orjson.JSONDecodeError:
             url_list = [urls]  # Single URL as string
-    
+
     # Validate that at least one input is provided
     if not url_list:
         raise HTTPException(status_code=400, detail="Urls must be provided")
-    
-    # Validate top_k
-    if top_k < 1 or top_k > 100:
-        raise HTTPException(status_code=400, detail="top_k must be between 1 and 100")
-    
+
     try:
+        # One batched Gemini call for every category and one batched GPU
+        # forward for every embedding — the old loop made 2K serial remote
+        # calls for K URLs, with the sync embedder blocking the loop
+        categories, embeddings = await asyncio.gather(
+            gemini_service.categorize_items_from_urls(url_list),
+            asyncio.to_thread(embedder.get_embeddings, url_list),
+        )
+
+        def _query(vector, category):
+            # For Embedder 3
+            return pinecone_index.query(
+                vector=vector.tolist(),
+                top_k=top_k,
+                filter={
+                    "sub_category": {"$eq": category}
+                },
+                include_metadata=True
+            )
+
+        # Fan the per-URL Pinecone queries out over worker threads; the
+        # REST client takes one vector per query, so concurrency is how
+        # the round-trips overlap
+        query_results = await asyncio.gather(*(
+            asyncio.to_thread(_query, embedding, category)
+            for embedding, category in zip(embeddings, categories)
+            if embedding is not None
+        ))
+        query_iter = iter(query_results)
+
         all_results = []
-        
-        # Process URLs if provided
-        if url_list:
-            for url in url_list:
-                category = await gemini_service.categorize_item_from_url(url)
-                query_embedding = embedder.get_embedding(url)
-                if query_embedding is None:
-                    all_results.append({
-                        "query_identifier": url,
-                        "success": False,
-                        "error": "Failed to process image from URL",
-                        "results": []
-                    })
-                    continue
-                
-                # For Embedder 3
-                results = pinecone_index.query(
-                    vector=query_embedding.tolist(),
-                    top_k=top_k,
-                    filter={
-                        "sub_category": {"$eq": category}
-                    },
-                    include_metadata=True
+        for url, embedding in zip(url_list, embeddings):
+            if embedding is None:
+                all_results.append(SearchQueryResult(
+                    query_identifier=url,
+                    success=False,
+                    error="Failed to process image from URL",
+                ))
+                continue
+
+            results = next(query_iter)
+            formatted_results = []
+            # For Embedder 3
+            for match in results['matches']:
+                # Pinecone's own response is trusted — model_construct
+                # skips validation on the hottest per-hit allocation
+                hit = SearchHit.model_construct(
+                    id=match['id'],
+                    similarity_score=float(match['score']),
+                    metadata=match.get('metadata', {}),
+                    image_path=match['metadata'].get('image_path', ''),
+                    filename=match['metadata'].get('filename', '')
                 )
+                if hit.similarity_score >= 0.6:
+                    formatted_results.append(hit)
+
+            all_results.append(SearchQueryResult(
+                query_identifier=url,
+                success=True,
+                results=formatted_results,
+            ))
 
-                # For Embedder 2
-                # results = pinecone_index.search(
-                #     namespace="__default__", 
-                #     query={
-                #         "inputs": {"text": query_embedding}, 
-                #         "top_k": top_k
-                #     }
-                # )
-
-                formatted_results = []
-                # For Embedder 3
-                for match in results['matches']:
-                    result = {
-                        "id": match['id'],
-                        "similarity_score": float(match['score']),
-                        "metadata": match.get('metadata', {}),
-                        "image_path": match['metadata'].get('image_path', ''),
-                        "filename": match['metadata'].get('filename', '')
-                    }
-                    if result['similarity_score'] >= 0.6:
-                        formatted_results.append(result)
-
-                # For Embedder 2
-                # for match in results['result'].get('hits', []):
-                #     result = {
-                #         "id": match['_id'],
-                #         "similarity_score": float(match['_score']),
-                #         "metadata": match.get('fields', {}),
-                #         "image_path": match['fields'].get('image_path', ''),
-                #         "filename": match['fields'].get('filename', '')
-                #     }
-                #     formatted_results.append(result)
-                
-                all_results.append({
-                    "query_identifier": url,
-                    "success": True,
-                    "results": formatted_results
-                })
-        
-        total_queries = len(url_list)
-        
-        return {
-            "success": True,
-            "total_queries": total_queries,
-            "results": all_results,
-            "total_database_size": pinecone_index.describe_index_stats()['total_vector_count']
-        }
+        stats = await get_index_stats(pinecone_index)
+        payload = SearchResponse(
+            success=True,
+            total_queries=len(url_list),
+            results=all_results,
+            total_database_size=stats['total_vector_count'],
+        )
+        # One pydantic-core dump straight to JSON bytes; exclude_none
+        # keeps the error key off successful entries as before
+        return Response(content=_SEARCH_ADAPTER.dump_json(payload, exclude_none=True),
+                        media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
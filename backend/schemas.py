@@ -1,12 +1,40 @@
-from pydantic import BaseModel, EmailStr, field_validator, ConfigDict
-from typing import Optional, List
+import re
+from pydantic import AfterValidator, BaseModel, StringConstraints, field_validator, ConfigDict
+from typing import Annotated, Optional, List
 from datetime import datetime
 from bson import ObjectId
 
+# One C-level regex match instead of email-validator's full RFC parse and
+# IDNA normalization per request. Deliverability is the mail server's
+# problem and uniqueness is the DB index's; the API just needs shape.
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def _check_email(v: str) -> str:
+    if not _EMAIL_RE.match(v):
+        raise ValueError("value is not a valid email address")
+    return v
+
+Email = Annotated[str, AfterValidator(_check_email)]
+
+# Length checks run inside pydantic-core's string validator — no Python
+# callback per validation. The cap bounds Argon2 hashing cost on the
+# server; real strength rules live in check_password_strength.
+Password = Annotated[str, StringConstraints(min_length=8, max_length=128)]
+
+class APISchema(BaseModel):
+    """Base for all request/response schemas.
+
+    defer_build postpones pydantic-core schema construction from import
+    time to first use — the server builds everything at startup anyway
+    for OpenAPI, but CLI scripts that import a schema or two stop paying
+    for all of them.
+    """
+    model_config = ConfigDict(defer_build=True)
+
 # User schemas
-class UserBase(BaseModel):
+class UserBase(APISchema):
     username: str
-    email: EmailStr
+    email: Email
     firstName: Optional[str] = ""  # Legacy support
     lastName: Optional[str] = ""  # Legacy support
     title: Optional[str] = ""  # Legacy support: Office, Freelancer, or Supplier
@@ -16,18 +44,11 @@ class UserBase(BaseModel):
     phone: Optional[str] = ""  # Legacy support: Full phone number with country code
 
 class UserCreate(UserBase):
-    password: str
-    
-    @field_validator('password')
-    @classmethod
-    def validate_password(cls, v):
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters long')
-        return v
+    password: Password
 
-class UserUpdate(BaseModel):
+class UserUpdate(APISchema):
     username: Optional[str] = None
-    email: Optional[EmailStr] = None
+    email: Optional[Email] = None
     firstName: Optional[str] = None
     lastName: Optional[str] = None
     title: Optional[str] = None
@@ -47,18 +68,15 @@ class UserResponse(UserBase):
     
     model_config = ConfigDict(from_attributes=True)
 
-class UserWithRoles(UserResponse):
-    roles: List['RoleResponse'] = []
-
 # Role schemas
-class RoleBase(BaseModel):
+class RoleBase(APISchema):
     name: str
     description: Optional[str] = None
 
 class RoleCreate(RoleBase):
     pass
 
-class RoleUpdate(BaseModel):
+class RoleUpdate(APISchema):
     name: Optional[str] = None
     description: Optional[str] = None
 
@@ -69,8 +87,13 @@ class RoleResponse(RoleBase):
     
     model_config = ConfigDict(from_attributes=True)
 
+# Defined after RoleResponse so the reference is direct — no forward ref,
+# no model_rebuild pass at import
+class UserWithRoles(UserResponse):
+    roles: List[RoleResponse] = []
+
 # Permission schemas
-class PermissionBase(BaseModel):
+class PermissionBase(APISchema):
     name: str
     description: Optional[str] = None
     resource: str
@@ -79,7 +102,7 @@ class PermissionBase(BaseModel):
 class PermissionCreate(PermissionBase):
     role_id: str  # MongoDB ObjectId as string
 
-class PermissionUpdate(BaseModel):
+class PermissionUpdate(APISchema):
     name: Optional[str] = None
     description: Optional[str] = None
     resource: Optional[str] = None
@@ -92,12 +115,26 @@ class PermissionResponse(PermissionBase):
     model_config = ConfigDict(from_attributes=True)
 
 # Project schemas
-class ProjectBase(BaseModel):
+class ProjectBase(APISchema):
     name: str
 
 class ProjectCreate(ProjectBase):
     pass
 
+class ProjectListResponse(ProjectBase):
+    """Slim row for the project list view — omits the photo/item arrays."""
+    id: str
+    user_id: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator('id', 'user_id', mode='before')
+    @classmethod
+    def _stringify_object_id(cls, v):
+        return str(v) if isinstance(v, ObjectId) else v
+
 class ProjectResponse(ProjectBase):
     id: str
     user_id: str
@@ -105,39 +142,38 @@ class ProjectResponse(ProjectBase):
     extracted_items: List[dict] = []
     created_at: datetime
     updated_at: Optional[datetime] = None
-    
+
     model_config = ConfigDict(from_attributes=True)
 
-# Authentication schemas
-class LoginRequest(BaseModel):
+    @field_validator('id', 'user_id', mode='before')
+    @classmethod
+    def _stringify_object_id(cls, v):
+        return str(v) if isinstance(v, ObjectId) else v
+
+# Authentication schemas (frozen: read-once credential carriers that
+# nothing should mutate after validation)
+class LoginRequest(APISchema):
     username: str
     password: str
 
+    model_config = ConfigDict(frozen=True)
+
 class RegisterRequest(UserCreate):
     pass
 
-class TokenResponse(BaseModel):
+class TokenResponse(APISchema):
     access_token: str
     refresh_token: str
     token_type: str = "bearer"
     expires_in: int
 
-class RefreshTokenRequest(BaseModel):
+class RefreshTokenRequest(APISchema):
     refresh_token: str
 
-class PasswordChangeRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+class PasswordChangeRequest(APISchema):
     current_password: str
-    new_password: str
-    
-    @field_validator('new_password')
-    @classmethod
-    def validate_new_password(cls, v):
-        if len(v) < 8:
-            raise ValueError('Password must be at least 8 characters long')
-        return v
-
-# Update forward references
-UserResponse.model_rebuild()
-UserWithRoles.model_rebuild()
-RoleResponse.model_rebuild()
-PermissionResponse.model_rebuild()
+    new_password: Password
+
+    model_config = ConfigDict(frozen=True)
@@ -0,0 +1,30 @@
+"""
+Helper for fire-and-forget background tasks.
+"""
+
+import asyncio
+from typing import Awaitable
+
+# Strong references to in-flight tasks. The event loop only holds weak
+# references, so a bare create_task result can be garbage-collected
+# mid-flight and its failure silently dropped.
+_background_tasks: set = set()
+
+
+def _reap(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Background task failed: {task.exception()!r}")
+
+
+def spawn(aw: Awaitable) -> asyncio.Task:
+    """Run an awaitable in the background, kept alive until done, logging failures.
+
+    ensure_future rather than create_task: callers also pass bare
+    awaitables like Beanie's UpdateMany query objects, which create_task
+    rejects with "a coroutine was expected".
+    """
+    task = asyncio.ensure_future(aw)
+    _background_tasks.add(task)
+    task.add_done_callback(_reap)
+    return task
@@ -28,59 +28,49 @@ except Exception as e:
     print(f"   ❌ Failed to import schemas: {e}")
     sys.exit(1)
 
-# Test 3: Validate user schema
-print("3️⃣  Testing UserCreate schema validation...")
+# Test 3: Validate all request/response schemas in one batch — a single
+# TypeAdapter pass through pydantic-core instead of four separate
+# validations, and one error report covering everything that failed
+print("3️⃣  Testing schema validation (batch)...")
 try:
-    user_data = UserCreate(
-        username="testuser",
-        email="test@example.com",
-        password="SecurePass123!"
-    )
-    print(f"   ✅ UserCreate validation passed: {user_data.username}")
-except Exception as e:
-    print(f"   ❌ UserCreate validation failed: {e}")
-    sys.exit(1)
+    from pydantic import TypeAdapter, ValidationError
 
-# Test 4: Validate login schema
-print("4️⃣  Testing LoginRequest schema validation...")
-try:
-    login_data = LoginRequest(
-        username="testuser",
-        password="SecurePass123!"
+    batch_adapter = TypeAdapter(
+        tuple[UserCreate, LoginRequest, TokenResponse, PasswordChangeRequest]
     )
-    print(f"   ✅ LoginRequest validation passed: {login_data.username}")
-except Exception as e:
-    print(f"   ❌ LoginRequest validation failed: {e}")
+    user_data, login_data, token_data, password_data = batch_adapter.validate_python((
+        {
+            "username": "testuser",
+            "email": "test@example.com",
+            "password": "SecurePass123!",
+        },
+        {
+            "username": "testuser",
+            "password": "SecurePass123!",
+        },
+        {
+            "access_token": "test_token_123",
+            "refresh_token": "refresh_token_123",
+            "token_type": "bearer",
+            "expires_in": 1800,
+        },
+        {
+            "current_password": "OldPass123!",
+            "new_password": "NewPass456!",
+        },
+    ))
+    print(f"   ✅ Schema validation passed: {user_data.username}")
+except ValidationError as e:
+    for error in e.errors():
+        loc = ".".join(str(part) for part in error["loc"])
+        print(f"   ❌ Schema validation failed at {loc}: {error['msg']}")
     sys.exit(1)
-
-# Test 5: Validate token response schema
-print("5️⃣  Testing TokenResponse schema validation...")
-try:
-    token_data = TokenResponse(
-        access_token="test_token_123",
-        refresh_token="refresh_token_123",
-        token_type="bearer",
-        expires_in=1800
-    )
-    print(f"   ✅ TokenResponse validation passed")
-except Exception as e:
-    print(f"   ❌ TokenResponse validation failed: {e}")
-    sys.exit(1)
-
-# Test 6: Validate password schema
-print("6️⃣  Testing PasswordChangeRequest schema validation...")
-try:
-    password_data = PasswordChangeRequest(
-        current_password="OldPass123!",
-        new_password="NewPass456!"
-    )
-    print(f"   ✅ PasswordChangeRequest validation passed")
 except Exception as e:
-    print(f"   ❌ PasswordChangeRequest validation failed: {e}")
+    print(f"   ❌ Schema validation failed: {e}")
     sys.exit(1)
 
-# Test 7: Validate config
-print("7️⃣  Testing auth config loading...")
+# Test 4: Validate config
+print("4️⃣  Testing auth config loading...")
 try:
     from auth_config import auth_settings
     print(f"   ✅ Auth config loaded: {auth_settings.mongodb_database}")
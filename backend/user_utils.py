@@ -2,26 +2,148 @@
 Utility functions for converting User model to response format.
 """
 
-from typing import Dict, Any
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, TypedDict
+
+from cachetools import LRUCache
+from pydantic import TypeAdapter
+
 from models import User
+from schemas import UserResponse
+
+# ObjectId → str is a small hex encode, but the same handful of role ids
+# recurs in every user of every list response. Caching on the raw 12
+# bytes shares one interned string per id instead of re-encoding it per
+# row. 4096 entries ≈ a few hundred KB, plenty for ids hot at once.
+_oid_str_cache: LRUCache = LRUCache(maxsize=4096)
+
+
+def _sid(oid) -> str:
+    """Stringify an ObjectId through the shared cache."""
+    key = oid.binary
+    s = _oid_str_cache.get(key)
+    if s is None:
+        s = str(oid)
+        _oid_str_cache[key] = s
+    return s
+
+
+class UserDict(TypedDict):
+    """Exact shape of the user response payload.
+
+    A plain dict, not a BaseModel — callers that go straight to JSON
+    (the export stream, the list page) skip the model instance and its
+    fields-set bookkeeping entirely.
+    """
+    id: str
+    username: str
+    email: str
+    firstName: str
+    lastName: str
+    title: str
+    officeName: Optional[str]
+    supplierName: Optional[str]
+    location: str
+    phone: str
+    is_active: bool
+    is_verified: bool
+    created_at: Optional[datetime]
+    role_ids: List[str]
+
+# Built once at import — reuses the same pydantic-core schema for every
+# UserResponse serialization instead of rebuilding per call
+_USER_ADAPTER = TypeAdapter(UserResponse)
+_USER_LIST_ADAPTER = TypeAdapter(List[UserResponse])
+
+
+def user_response_json(payload: "UserDict") -> bytes:
+    """Serialize one user payload straight to JSON bytes.
+
+    Same trusted-data contract as user_to_response, but it ends in a
+    single dump_json call — handlers hand the bytes to a Response and
+    skip jsonable_encoder and response_model re-validation entirely.
+    """
+    return _USER_ADAPTER.dump_json(UserResponse.model_construct(**payload))
 
 
-def user_to_dict(user: User) -> Dict[str, Any]:
+def users_to_response_json(docs: Iterable[Dict[str, Any]]) -> bytes:
+    """Serialize raw user documents to a JSON array in one core pass.
+
+    The rows come from our own projected queries, so model_construct
+    skips validation and the list adapter walks everything in a single
+    dump_json call instead of a per-element serialize.
+    """
+    rows = [UserResponse.model_construct(**raw_user_to_dict(doc)) for doc in docs]
+    return _USER_LIST_ADAPTER.dump_json(rows)
+
+# Exactly the fields the converters below emit (_id comes back
+# implicitly). Passing this as a Mongo projection means read-only user
+# queries never BSON-decode hashed_password, role_names or audit fields.
+USER_RESPONSE_PROJECTION = {
+    "username": 1,
+    "email": 1,
+    "firstName": 1,
+    "lastName": 1,
+    "title": 1,
+    "officeName": 1,
+    "supplierName": 1,
+    "location": 1,
+    "phone": 1,
+    "is_active": 1,
+    "is_verified": 1,
+    "created_at": 1,
+    "role_ids": 1,
+}
+
+
+def user_to_response(user: User) -> UserResponse:
+    """Convert a User document to a UserResponse.
+
+    The input is our own hydrated document — user_to_dict has already
+    stringified the ObjectIds and every other field is a native type —
+    so model_construct skips validation entirely. Externally-sourced
+    data must keep going through model_validate.
+    """
+    return UserResponse.model_construct(**user_to_dict(user))
+
+
+def user_to_dict(user: User) -> UserDict:
     """Convert User model to dictionary with proper ObjectId handling."""
     return {
-        "id": str(user.id),
+        "id": _sid(user.id),
         "username": user.username,
         "email": user.email,
-        "firstName": user.firstName if user.firstName else "",
-        "lastName": user.lastName if user.lastName else "",
-        "title": user.title if user.title else "",
+        "firstName": user.firstName or "",
+        "lastName": user.lastName or "",
+        "title": user.title or "",
         "officeName": user.officeName,
         "supplierName": user.supplierName,
-        "location": user.location if user.location else "",
-        "phone": user.phone if user.phone else "",
+        "location": user.location or "",
+        "phone": user.phone or "",
         "is_active": user.is_active,
         "is_verified": user.is_verified,
         "created_at": user.created_at,
-        "role_ids": [str(rid) for rid in user.role_ids],
+        # role ids repeat across users — served from the shared cache
+        "role_ids": [_sid(rid) for rid in user.role_ids],
+    }
+
+
+def raw_user_to_dict(doc: Dict[str, Any]) -> UserDict:
+    """Convert a raw MongoDB user document (no Beanie hydration) to a response dict."""
+    return {
+        "id": _sid(doc["_id"]),
+        "username": doc.get("username", ""),
+        "email": doc.get("email", ""),
+        "firstName": doc.get("firstName") or "",
+        "lastName": doc.get("lastName") or "",
+        "title": doc.get("title") or "",
+        "officeName": doc.get("officeName"),
+        "supplierName": doc.get("supplierName"),
+        "location": doc.get("location") or "",
+        "phone": doc.get("phone") or "",
+        "is_active": doc.get("is_active", True),
+        "is_verified": doc.get("is_verified", False),
+        "created_at": doc.get("created_at"),
+        "role_ids": [_sid(rid) for rid in doc.get("role_ids", [])],
     }
 